@@ -0,0 +1,159 @@
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from magick_prototype.engine import HELD_FRAME_WINDOW, default_workers
+from magick_prototype.events import JobProgress
+from magick_prototype.panels import Panel, list_panels
+from magick_prototype.progress import ProgressThrottle
+from magick_prototype.render import PdfRenderer, RenderSettings
+from magick_prototype.sources import MMAP_MIN_BYTES, PAGE_CACHE_HINTS
+
+
+def physical_memory():
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+@dataclass
+class BatchJob:
+    my_dir: str
+    settings: RenderSettings
+    target_dir: str | None = None
+    panels: list[Panel] | None = None
+    state: str = 'Queued'
+    done: int = 0
+    error: Exception | None = None
+    job_id: int = field(default=0, compare=False)
+
+    @property
+    def total(self):
+        return len(self.panels) if self.panels else 0
+
+    def estimate_memory(self, workers):
+        """
+        The renderer's ceiling for this folder on a pool of workers, it does not grow with the number of frames.
+        - encoded panels of (workers + 1) shards waiting for the pool and 1.25 shards in each worker writing one,
+          a shard never holds more than the whole folder's panels, roughly twice its source size
+        - 6 source files a worker in flight or read ahead, a large source is mapped instead where it can be
+        - the encoded panels of the HELD_FRAME_WINDOW frames kept for held cels, taken from the largest sources
+        """
+        sizes = []
+        for panel in self.panels:
+            try:
+                sizes.append(os.path.getsize(os.path.join(self.my_dir, panel.file_name)))
+            except OSError:
+                pass
+        shard_bytes = min(self.settings.shard_max_bytes, sum(sizes) * 2)
+        source_bytes = max(sizes, default=0)
+        if PAGE_CACHE_HINTS:
+            source_bytes = min(source_bytes, MMAP_MIN_BYTES)
+        held_bytes = sum(sorted(sizes)[-HELD_FRAME_WINDOW:]) * 2
+        return int((workers + 1) * shard_bytes + 1.25 * workers * shard_bytes + 6 * workers * source_bytes +
+                   held_bytes)
+
+
+class BatchScheduler:
+    """
+    Runs queued folders concurrently on one shared render pool.
+    - cpu_budget is the total number of render processes across all jobs
+    - a job only starts when its memory estimate fits in what is left of memory_budget,
+      the first job always starts so an oversized folder still renders on its own
+    - on_event gets a JobProgress from job threads when a job's state changes and, throttled, as panels finish
+    - jobs not started before a stop stay 'Queued' and run on the next run()
+    - executor is the pool to render on, by default run() starts a process pool of cpu_budget workers
+    """
+
+    def __init__(self, cpu_budget=None, memory_budget=None, max_parallel_jobs=2, on_event=None, executor=None):
+        self.cpu_budget = max(1, cpu_budget or default_workers())
+        if memory_budget is None and physical_memory():
+            memory_budget = physical_memory() // 2
+        self.memory_budget = memory_budget
+        self.max_parallel_jobs = max(1, max_parallel_jobs)
+        self.on_event = on_event or (lambda event: None)
+        self.executor = executor
+
+        self.jobs: list[BatchJob] = []
+        self._lock = threading.Lock()
+        self._next_id = 1
+
+    def add(self, job: BatchJob):
+        with self._lock:
+            job.job_id = self._next_id
+            self._next_id += 1
+            self.jobs.append(job)
+        return job
+
+    def _report(self, job):
+        self.on_event(JobProgress(job.job_id, job.settings.name, job.state, job.done, job.total))
+
+    def _set_state(self, job, state):
+        job.state = state
+        self._report(job)
+
+    def _run_job(self, job: BatchJob, executor, should_stop):
+        job.settings.workers = self.cpu_budget
+        self._set_state(job, 'Rendering')
+
+        def on_progress(done):
+            job.done = done
+            self._report(job)
+
+        progress = ProgressThrottle(on_progress)
+        renderer = PdfRenderer(job.my_dir, job.panels, job.settings, target_dir=job.target_dir,
+                               on_event=progress, executor=executor)
+        renderer.render(should_stop=should_stop)
+        progress.flush()
+        self._set_state(job, 'Stopped' if should_stop() else 'Done')
+
+    def run(self, should_stop=lambda: False):
+        if self.executor:
+            return self._run(self.executor, should_stop)
+
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=self.cpu_budget) as executor:
+            return self._run(executor, should_stop)
+
+    def _run(self, executor, should_stop):
+        queued = [job for job in self.jobs if job.state == 'Queued']
+        running = {}
+        estimates = {}
+        memory_in_use = 0
+
+        with ThreadPoolExecutor(max_workers=self.max_parallel_jobs) as job_threads:
+            while queued or running:
+                # admit as many queued jobs as the budgets allow
+                while queued and len(running) < self.max_parallel_jobs and not should_stop():
+                    job = queued[0]
+                    if job.panels is None:
+                        try:
+                            job.panels = list_panels(job.my_dir)
+                        except OSError as e:
+                            # a missing or unreadable folder fails its own job, the rest of the batch goes on
+                            queued.pop(0)
+                            job.error = e
+                            self._set_state(job, 'Error')
+                            continue
+                    if job.job_id not in estimates:
+                        estimates[job.job_id] = job.estimate_memory(self.cpu_budget)
+                    estimate = estimates[job.job_id]
+                    if running and self.memory_budget and memory_in_use + estimate > self.memory_budget:
+                        break
+                    queued.pop(0)
+                    memory_in_use += estimate
+                    running[job_threads.submit(self._run_job, job, executor, should_stop)] = (job, estimate)
+
+                if not running:
+                    break
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    job, estimate = running.pop(future)
+                    memory_in_use -= estimate
+                    if future.exception():
+                        job.error = future.exception()
+                        self._set_state(job, 'Error')
+
+        return self.jobs
@@ -0,0 +1,129 @@
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import shutil
+import sys
+import tempfile
+import time
+from PIL import Image, ImageDraw
+from magick_prototype.panels import PanelScan
+from magick_prototype.render import PdfRenderer, RenderSettings
+
+BENCH_VERSION = 2
+FRAMES_PER_SCENE = 24
+FRAMES_PER_EPISODE = 1000
+
+
+def make_storyboard(my_dir, count, size):
+    """ Fill my_dir with count frame_episode_scene.png frames, frames already there are kept """
+    os.makedirs(my_dir, exist_ok=True)
+    width, height = size
+    for index in range(count):
+        frame = index + 1
+        episode = 101 + index // FRAMES_PER_EPISODE
+        scene = (index // FRAMES_PER_SCENE) % 1000
+        path = os.path.join(my_dir, f"{frame}_{episode}_{scene:03d}.png")
+        if os.path.exists(path):
+            continue
+
+        # a flat scene color with a box moving across it, close enough to a rough board to compress like one
+        image = Image.new("RGB", (width, height), color=((scene * 47) % 256, (scene * 91) % 256, 160))
+        draw = ImageDraw.Draw(image)
+        box = width // 6
+        x = (index % FRAMES_PER_SCENE) * (width - box) // FRAMES_PER_SCENE
+        draw.rectangle((x, height // 3, x + box, height // 3 + box), fill=(240, 240, 240), outline=(0, 0, 0))
+        draw.line((0, height - 1, width, 0), fill=(20, 20, 20), width=max(1, width // 400))
+        image.save(path, compress_level=1)
+
+
+def peak_rss():
+    """ Peak resident memory in bytes of this process and of its largest finished child, None where unknown """
+    try:
+        import resource
+    except ImportError:
+        return None, None
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale)
+
+
+def run_case(my_dir, out_dir, settings: RenderSettings, results):
+    start = time.perf_counter()
+    renderer = PdfRenderer(my_dir, PanelScan(my_dir).start(), settings, target_dir=out_dir)
+    renderer.render()
+    seconds = time.perf_counter() - start
+
+    panels_per_page = settings.panel_rows * settings.panel_columns
+    pages = len(renderer.panels) + -(-len(renderer.panels) // panels_per_page)
+    rss, children_rss = peak_rss()
+    results.put({
+        "seconds": round(seconds, 6),
+        "pages": pages,
+        "pages_per_second": round(pages / seconds, 3),
+        "stages": renderer.stats.as_dict(),
+        "peak_rss_bytes": rss,
+        "peak_worker_rss_bytes": children_rss,
+        "singles_bytes": os.path.getsize(renderer.pdf_singles_save_path),
+        "grid_bytes": os.path.getsize(renderer.pdf_grid_save_path),
+    })
+
+
+def run_bench(counts, sizes, settings: RenderSettings, bench_dir=None, keep=True, log=None):
+    """
+    Render a synthetic folder for every count and size, each in a fresh process so peak RSS is its own.
+    - frames are generated once under bench_dir and reused by later runs unless keep is False
+    - the PDFs are written to a temporary folder and removed after each run
+    """
+    log = log or (lambda message: None)
+    bench_dir = bench_dir or os.path.join(tempfile.gettempdir(), "magick_bench")
+    context = multiprocessing.get_context("spawn")
+
+    runs = []
+    for width, height in sizes:
+        for count in counts:
+            my_dir = os.path.join(bench_dir, f"{width}x{height}", f"{count}")
+            log(f"generating {count} frames at {width}x{height} in {my_dir}")
+            make_storyboard(my_dir, count, (width, height))
+
+            log(f"rendering {count} frames at {width}x{height}")
+            out_dir = tempfile.mkdtemp(prefix="magick_bench_")
+            results = context.Queue()
+            process = context.Process(target=run_case, args=(my_dir, out_dir, settings, results))
+            process.start()
+            try:
+                while True:
+                    try:
+                        result = results.get(timeout=1)
+                        break
+                    except queue.Empty:
+                        if not process.is_alive():
+                            raise RuntimeError(f"benchmark of {my_dir} exited with {process.exitcode}")
+            finally:
+                process.join()
+                shutil.rmtree(out_dir, ignore_errors=True)
+                if not keep:
+                    shutil.rmtree(my_dir, ignore_errors=True)
+
+            runs.append({"frames": count, "width": width, "height": height, **result})
+
+    return {
+        "version": BENCH_VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "workers": settings.workers,
+        "use_cache": settings.use_cache,
+        "runs": runs,
+    }
+
+
+def write_report(report, path=None):
+    text = json.dumps(report, indent=2)
+    if not path:
+        print(text)
+        return
+    with open(path, "w") as report_file:
+        report_file.write(text + "\n")
@@ -0,0 +1,115 @@
+import dataclasses
+import hashlib
+import os
+from io import BytesIO
+from PIL import Image
+from magick_prototype.engine import PanelImage, PanelJob, PanelStyle
+
+# bump when the compositing output changes so old entries are never reused
+CACHE_VERSION = 2
+CACHE_DIR_NAME = ".magick_cache"
+DEFAULT_CACHE_MAX_BYTES = 2 * 1024 ** 3
+
+
+class RenderCache:
+    """
+    Encoded panels stored under <target dir>/.magick_cache, one JPEG per panel and style.
+    - entries are keyed by the source file name, mtime and size plus every setting that changes the pixels
+    - hits are touched so the oldest modified entries are the least recently used ones
+    - evict() trims the cache back to max_bytes, call it once a run is done
+    """
+
+    def __init__(self, target_dir, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        self.cache_dir = os.path.join(target_dir, CACHE_DIR_NAME)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def source_stat(self, job: PanelJob):
+        try:
+            stat = os.stat(os.path.join(job.my_dir, job.file_name))
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def key(self, job: PanelJob, style: PanelStyle, source_stat):
+        if source_stat is None:
+            return None
+        parts = (
+            CACHE_VERSION, job.file_name, *source_stat,
+            job.episode, job.scene, tuple(job.font_color), tuple(job.background_color),
+            dataclasses.astuple(style),
+        )
+        return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.jpg")
+
+    def get(self, key):
+        if key is None:
+            return None
+        path = self.entry_path(key)
+        try:
+            with open(path, "rb") as entry_file:
+                data = entry_file.read()
+            os.utime(path)
+        except OSError:
+            return None
+        # only the JPEG header is parsed to get the size, the pixels are never decoded
+        with Image.open(BytesIO(data)) as image:
+            width, height = image.size
+        return PanelImage(data, width, height)
+
+    def get_all(self, job: PanelJob, styles: dict[str, PanelStyle], source_stat):
+        """ Return every style of a panel from the cache, or None if any of them is missing """
+        panel_images = {}
+        for name, style in styles.items():
+            panel_image = self.get(self.key(job, style, source_stat))
+            if panel_image is None:
+                self.misses += 1
+                return None
+            panel_images[name] = panel_image
+        self.hits += 1
+        return panel_images
+
+    def put(self, key, panel_image: PanelImage):
+        if key is None:
+            return
+        path = self.entry_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as entry_file:
+                entry_file.write(panel_image.data)
+            os.replace(tmp_path, path)
+        except OSError:
+            # a failed cache write only costs a re-render next time
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def put_all(self, job: PanelJob, styles: dict[str, PanelStyle], panel_images: dict[str, PanelImage],
+                source_stat):
+        # source_stat is taken before rendering, a frame replaced mid-render is simply rendered again next time
+        for name, style in styles.items():
+            self.put(self.key(job, style, source_stat), panel_images[name])
+
+    def evict(self):
+        entries = []
+        total_size = 0
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if not entry.name.endswith(".jpg"):
+                    continue
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total_size += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total_size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total_size -= size
+            except OSError:
+                pass
@@ -0,0 +1,111 @@
+import json
+import os
+from dataclasses import asdict, dataclass
+
+# bump when the checkpoint layout changes so an old one is started over instead of misread
+CHECKPOINT_VERSION = 3
+
+
+@dataclass(frozen=True)
+class ShardRecord:
+    singles_path: str | None  # None when the render writes no singles PDF
+    grid_path: str | None
+    first_index: int
+    last_index: int
+    digest: str  # of the settings and of the name and source stat of every panel in the shard
+
+    @property
+    def paths(self):
+        return tuple(path for path in (self.singles_path, self.grid_path) if path)
+
+
+class Checkpoint:
+    """
+    The shards of a render already written, kept next to the PDFs as <name>.checkpoint.json.
+    - add() records a shard and saves at once, only shards of whole grid pages are recorded
+      so a render reusing them starts every other shard on a fresh page
+    - a recorded shard can be reused as long as its digest matches, retain() drops the others with their files
+    - the recorded shards stay on disk as .part files until remove() deletes all of it
+    - fingerprint is of the settings the shards were written with, PdfRenderer.fingerprint() without a layout
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.fingerprint: str | None = None
+        self.shards: list[ShardRecord] = []  # by first_index
+
+    @classmethod
+    def load(cls, path, resume=True):
+        """ The checkpoint at path, or a new one after removing what it recorded when not resuming """
+        checkpoint = cls(path)
+        try:
+            with open(path, "r") as checkpoint_file:
+                data = json.load(checkpoint_file)
+        except (OSError, ValueError):
+            return checkpoint
+
+        base_dir = os.path.dirname(path)
+        if data.get("version") == CHECKPOINT_VERSION:
+            checkpoint.fingerprint = data["fingerprint"]
+            checkpoint.shards = [
+                ShardRecord(**{**shard, **{key: os.path.join(base_dir, shard[key])
+                                           for key in ("singles_path", "grid_path") if shard[key]}})
+                for shard in data["shards"]
+            ]
+        else:
+            # an older layout is not reused, its part files are left unrecorded for the renderer to remove
+            checkpoint.shards = []
+        if not resume:
+            checkpoint.remove()
+        return checkpoint
+
+    def add(self, record: ShardRecord):
+        # by first panel, a render writing only the image sinks records shards without paths
+        self.shards = sorted(
+            [shard for shard in self.shards if shard.first_index != record.first_index] + [record],
+            key=lambda shard: shard.first_index,
+        )
+        self.save()
+
+    def retain(self, records):
+        """ Keep only records whose files still exist, remove every other recorded shard """
+        records = [record for record in records if all(os.path.exists(path) for path in record.paths)]
+        kept_paths = {path for record in records for path in record.paths}
+        for shard in self.shards:
+            for path in shard.paths:
+                if path not in kept_paths and os.path.exists(path):
+                    os.remove(path)
+        records = sorted(records, key=lambda shard: shard.first_index)
+        if records != self.shards:
+            self.shards = records
+            self.save()
+        return self.shards
+
+    def is_recorded(self, shard_path):
+        return any(shard_path in shard.paths for shard in self.shards)
+
+    def save(self):
+        data = {
+            "version": CHECKPOINT_VERSION,
+            "fingerprint": self.fingerprint,
+            "shards": [
+                {**asdict(shard), **{key: os.path.basename(path)
+                                     for key, path in (("singles_path", shard.singles_path),
+                                                       ("grid_path", shard.grid_path)) if path}}
+                for shard in self.shards
+            ],
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as checkpoint_file:
+            json.dump(data, checkpoint_file, indent=2)
+        # replaced in one step, a crash while saving leaves the previous checkpoint
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        for shard in self.shards:
+            for path in shard.paths:
+                if os.path.exists(path):
+                    os.remove(path)
+        self.shards = []
+        if os.path.exists(self.path):
+            os.remove(self.path)
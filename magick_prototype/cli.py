@@ -0,0 +1,277 @@
+import argparse
+import json
+import os
+import sys
+from dataclasses import replace
+from magick_prototype.batch import BatchJob, BatchScheduler
+from magick_prototype.bench import run_bench, write_report
+from magick_prototype.cache import CACHE_DIR_NAME, DEFAULT_CACHE_MAX_BYTES
+from magick_prototype.engine import default_workers
+from magick_prototype.events import FramesChanged, PanelStarted, RenderError, RenderFinished
+from magick_prototype.layout import LAYOUTS, PAPER_SIZES, apply_layout
+from magick_prototype.panels import PanelScan
+from magick_prototype.progress import ProgressThrottle
+from magick_prototype.render import OUTPUTS, PdfRenderer, RenderSettings
+from magick_prototype.startup import STARTUP_BUDGET_SECONDS, import_times, startup_report
+from magick_prototype.themes import THEMES
+from magick_prototype.watch import watch_render
+
+
+def parse_color(value):
+    try:
+        color = tuple(int(part) for part in value.split(','))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected R,G,B, got {value!r}")
+    if len(color) != 3 or not all(0 <= part <= 255 for part in color):
+        raise argparse.ArgumentTypeError(f"expected R,G,B between 0 and 255, got {value!r}")
+    return color
+
+
+def parse_size(value):
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+    value = value.strip().upper().rstrip('B')
+    try:
+        if value and value[-1] in units:
+            return int(float(value[:-1]) * units[value[-1]])
+        return int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a size like 512M or 8G, got {value!r}")
+
+
+def render_command(args):
+    my_dir = os.path.abspath(args.dir)
+    if not os.path.isdir(my_dir):
+        print(f"Not a folder: {my_dir}", file=sys.stderr)
+        return 1
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    # start compositing the first frames while the rest of the folder is still being listed
+    scan = PanelScan(my_dir, probe=True).start()
+
+    settings = RenderSettings.from_theme(
+        THEMES[args.theme],
+        name=args.name or os.path.basename(my_dir),
+        include_filename=args.include_filename,
+        export_panels=args.export_panels,
+        workers=args.workers,
+        use_cache=args.use_cache,
+        cache_max_bytes=args.cache_size,
+        single_max_size=args.single_max_size,
+        grid_max_size=args.grid_max_size,
+        write_profile=args.profile,
+        cprofile=args.cprofile,
+        resume=args.resume,
+        paper=args.paper,
+        outputs=tuple(args.outputs),
+    )
+    if args.font_color:
+        settings.font_color = args.font_color
+    settings = apply_layout(settings, args.layout)
+    if args.rows:
+        settings.panel_rows = args.rows
+    if args.columns:
+        settings.panel_columns = args.columns
+
+    if args.watch:
+        return watch_command(my_dir, scan, settings, args)
+
+    progress = ProgressThrottle(
+        lambda done: print(f"\r{done} / {len(renderer.panels)} Images Processed", end="", file=sys.stderr,
+                           flush=True)
+    )
+
+    renderer = PdfRenderer(my_dir, scan, settings, target_dir=args.output_dir, on_event=progress)
+    renderer.render()
+    progress.flush()
+    print(file=sys.stderr)
+    if not renderer.panels:
+        print(f"No images found in {my_dir}", file=sys.stderr)
+        return 1
+    if renderer.held_frames or renderer.duplicate_bytes:
+        print(f"{renderer.held_frames} held frames reused, "
+              f"{renderer.duplicate_bytes / 1024 ** 2:.1f} MB of duplicate images shared", file=sys.stderr)
+    for path in renderer.output_paths:
+        print(path)
+    if settings.write_profile:
+        print(renderer.profile_json_path)
+        print(renderer.profile_csv_path)
+    if settings.cprofile:
+        print(renderer.cprofile_path)
+    return 0
+
+
+def watch_command(my_dir, scan, settings: RenderSettings, args):
+    progress = None
+    output_paths = PdfRenderer(my_dir, [], settings, target_dir=args.output_dir).output_paths
+
+    def on_event(event):
+        nonlocal progress
+        if isinstance(event, PanelStarted) and progress is None:
+            progress = ProgressThrottle(
+                lambda done: print(f"\r{done} Images Processed", end="", file=sys.stderr, flush=True)
+            )
+        if progress:
+            progress(event)
+        if isinstance(event, FramesChanged):
+            print(f"{len(event.changed)} frames changed: {', '.join(event.changed[:5])}"
+                  f"{', ...' if len(event.changed) > 5 else ''}", file=sys.stderr)
+        elif isinstance(event, RenderError):
+            print(f"\n{event.message}", file=sys.stderr)
+        elif isinstance(event, RenderFinished):
+            if progress:
+                progress.flush()
+                progress = None
+            print(f"\nUpdated {', '.join(output_paths)}", file=sys.stderr)
+
+    print(f"Watching {my_dir}, press Ctrl+C to stop", file=sys.stderr)
+    try:
+        watch_render(my_dir, settings, target_dir=args.output_dir, on_event=on_event, scan=scan)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def parse_resolution(value):
+    try:
+        width, height = (int(part) for part in value.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected WIDTHxHEIGHT, got {value!r}")
+    return width, height
+
+
+def bench_command(args):
+    settings = RenderSettings(
+        name="bench",
+        workers=args.workers,
+        use_cache=args.use_cache,
+        grid_max_size=args.grid_max_size,
+    )
+    report = run_bench(args.frames, args.size, settings, bench_dir=args.dir, keep=args.keep,
+                       log=lambda message: print(message, file=sys.stderr))
+    write_report(report, args.output)
+    return 0
+
+
+def startup_command(args):
+    lines, within_budget = startup_report(import_times(args.module), top=args.top, budget=args.budget)
+    print("\n".join(lines))
+    return 0 if within_budget else 1
+
+
+def load_batch_jobs(manifest_path):
+    """
+    A batch manifest is a JSON list with one object per folder, for example
+    [{"dir": "ep101", "theme": "Previs", "name": "EP101", "panel_rows": 4}, {"dir": "ep102"}]
+    - dir is relative to the manifest
+    - layout is one of LAYOUTS, its grid settings are applied before the RenderSettings fields given
+    - any other key is a RenderSettings field
+    """
+    with open(manifest_path, "r") as manifest_file:
+        entries = json.load(manifest_file)
+
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    jobs = []
+    for entry in entries:
+        entry = dict(entry)
+        my_dir = os.path.join(base_dir, entry.pop("dir"))
+        theme = THEMES[entry.pop("theme", list(THEMES.keys())[0])]
+        target_dir = entry.pop("output_dir", None)
+        layout = entry.pop("layout", None)
+        entry.setdefault("name", os.path.basename(my_dir))
+        if "font_color" in entry:
+            entry["font_color"] = tuple(entry["font_color"])
+        settings = RenderSettings.from_theme(theme, **entry)
+        if layout:
+            settings = replace(apply_layout(settings, layout), **entry)
+        jobs.append(BatchJob(my_dir, settings, target_dir=target_dir))
+    return jobs
+
+
+def batch_command(args):
+    def on_event(event):
+        print(f"[{event.job_id}] {event.name}: {event.state} {event.done} / {event.total}", file=sys.stderr)
+
+    scheduler = BatchScheduler(cpu_budget=args.workers, memory_budget=args.memory_budget,
+                               max_parallel_jobs=args.parallel_jobs, on_event=on_event)
+    for job in load_batch_jobs(args.manifest):
+        scheduler.add(job)
+
+    jobs = scheduler.run()
+    failed = [job for job in jobs if job.state == 'Error']
+    for job in failed:
+        print(f"[{job.job_id}] {job.my_dir}: {job.error}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="magick_prototype", description="Create storyboard PDFs without the GUI")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    render = subparsers.add_parser("render", help="create <name>.pdf and <name>_grid.pdf from a folder of frames")
+    render.add_argument("dir", help="folder of frame_episode_scene images")
+    render.add_argument("--theme", choices=list(THEMES.keys()), default=list(THEMES.keys())[0])
+    render.add_argument("--name", help="PDF name, defaults to the folder name")
+    render.add_argument("--font-color", type=parse_color, help="override the theme font color as R,G,B")
+    render.add_argument("--no-filename", dest="include_filename", action="store_false",
+                        help="leave the PDF name off the pages")
+    render.add_argument("--export-panels", action="store_true", help="also write panels/<style>/ JPEGs")
+    render.add_argument("--workers", type=int, default=default_workers(), help="render processes")
+    render.add_argument("--output-dir", help="where to write the PDFs, defaults to the folder's parent")
+    render.add_argument("--no-cache", dest="use_cache", action="store_false",
+                        help=f"re-render every panel instead of reusing {CACHE_DIR_NAME} in the output dir")
+    render.add_argument("--cache-size", type=parse_size, default=DEFAULT_CACHE_MAX_BYTES,
+                        help="largest the render cache may grow, e.g. 2G")
+    render.add_argument("--single-max-size", type=int, help="longest side of a single panel in pixels")
+    render.add_argument("--grid-max-size", type=int, help="longest side of a grid panel in pixels, e.g. 960")
+    render.add_argument("--outputs", nargs="+", choices=OUTPUTS, default=["singles", "grid"],
+                        help="what to write: the singles and grid PDFs, a JPEG sequence and contact sheet PNGs")
+    render.add_argument("--layout", choices=list(LAYOUTS.keys()), default="3x3", help="grid page layout")
+    render.add_argument("--rows", type=int, help="panel rows of a grid page, overrides the layout")
+    render.add_argument("--columns", type=int, help="panel columns of a grid page, overrides the layout")
+    render.add_argument("--paper", choices=list(PAPER_SIZES.keys()),
+                        help="fit the grid pages onto paper instead of sizing them to the panels")
+    render.add_argument("--watch", action="store_true",
+                        help="keep running and update the PDFs whenever frames are added, changed or removed")
+    render.add_argument("--resume", action="store_true",
+                        help="continue a stopped or failed render from <name>.checkpoint.json in the output dir")
+    render.add_argument("--profile", action="store_true",
+                        help="write <name>_profile.json and <name>_profile.csv with per-stage timings")
+    render.add_argument("--cprofile", action="store_true",
+                        help="render on one thread under cProfile and write <name>.prof, much slower")
+    render.set_defaults(func=render_command)
+
+    batch = subparsers.add_parser("batch", help="render every folder listed in a JSON manifest")
+    batch.add_argument("manifest", help="JSON list of {\"dir\": ..., \"theme\": ..., \"name\": ...} jobs")
+    batch.add_argument("--workers", type=int, default=default_workers(),
+                       help="render processes shared by all jobs")
+    batch.add_argument("--memory-budget", type=parse_size, help="e.g. 8G, defaults to half the physical memory")
+    batch.add_argument("--parallel-jobs", type=int, default=2, help="folders rendered at the same time")
+    batch.set_defaults(func=batch_command)
+
+    bench = subparsers.add_parser("bench", help="time renders of synthetic storyboard folders and report JSON")
+    bench.add_argument("--frames", type=int, nargs="+", default=[100, 1000], help="frame counts, e.g. 100 1000 10000")
+    bench.add_argument("--size", type=parse_resolution, nargs="+", default=[(1920, 1080)],
+                       help="frame resolutions, e.g. 1920x1080 3840x2160")
+    bench.add_argument("--workers", type=int, default=default_workers(), help="render processes")
+    bench.add_argument("--cache", dest="use_cache", action="store_true",
+                       help="time renders with the cache on, it starts cold for every run")
+    bench.add_argument("--grid-max-size", type=int, help="longest side of a grid panel in pixels")
+    bench.add_argument("--dir", help="where the synthetic folders are generated, defaults to the temp folder")
+    bench.add_argument("--no-keep", dest="keep", action="store_false", help="delete the synthetic folders afterwards")
+    bench.add_argument("--output", help="write the JSON report here instead of stdout")
+    bench.set_defaults(func=bench_command)
+
+    startup = subparsers.add_parser("startup", help="report the slowest imports of the GUI, exits 1 over budget")
+    startup.add_argument("--module", default="prototype", help="module to import, defaults to the GUI")
+    startup.add_argument("--top", type=int, default=15, help="number of modules listed")
+    startup.add_argument("--budget", type=float, default=STARTUP_BUDGET_SECONDS, help="seconds the imports may take")
+    startup.set_defaults(func=startup_command)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
@@ -0,0 +1,544 @@
+import hashlib
+import os
+import queue
+import threading
+import time
+from io import BytesIO
+from collections import OrderedDict, deque
+from concurrent.futures import Executor, Future
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from PIL import Image, ImageDraw, ImageFont
+from magick_prototype.sources import open_source, read_source
+from magick_prototype.stats import RenderStats, stage
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+@dataclass(frozen=True)
+class PanelJob:
+    index: int
+    my_dir: str
+    file_name: str
+    frame: str
+    episode: str
+    scene: str
+    font_color: tuple[int, int, int]
+    background_color: tuple[int, int, int]
+    export_panels: bool = False
+
+
+@dataclass(frozen=True)
+class PanelOverlay:
+    data: bytes  # encoded JPEG
+    x: int  # from the panel's top left corner
+    y: int
+    width: int
+    height: int
+
+
+@dataclass(frozen=True)
+class PanelImage:
+    data: bytes  # encoded JPEG, handed straight to ReportLab
+    width: int
+    height: int
+    path: str | None = None  # only set when panels are exported
+    # the frame number is drawn over the panel, so held cels share one image in the PDFs
+    overlays: tuple[PanelOverlay, ...] = ()
+
+
+@dataclass(frozen=True)
+class PanelStyle:
+    name: str
+    add_header: bool = True
+    add_footer: bool = True
+    header_padding: int = 30
+    footer_padding: int = 30
+    header_font_size: int = 16
+    footer_font_size: int = 16
+    header_text_padding: int = 5
+    footer_text_padding: int = 10
+    font: str | None = None  # truetype file or name, None for Pillow's built-in font
+    max_size: int | None = None  # longest side of the source in pixels before compositing, None keeps full size
+
+    def panel_size(self, source_size):
+        """ Size of the panel composited from a source of source_size, known from its header alone """
+        width, height = fit_size(source_size, self.max_size)
+        return width, height + (self.header_padding if self.add_header else 0) + (
+            self.footer_padding if self.add_footer else 0)
+
+
+# layout variants rendered for every panel, register new styles here to get them from the same decode
+PANEL_STYLES: dict[str, PanelStyle] = {
+    "single": PanelStyle("single"),
+    "grid": PanelStyle("grid", add_header=False, footer_padding=45, header_font_size=24, footer_font_size=35),
+}
+
+
+# rendered header/footer tiles kept per process, a header repeats for every frame of its scene
+TEXT_TILE_CACHE_SIZE = 1024
+# recent panels compared against for held cels, their results stay in memory until they drop out
+HELD_FRAME_WINDOW = 64
+# sources read ahead of the pool per worker, their bytes wait in memory until a worker takes them
+READ_AHEAD_PER_WORKER = 2
+# panel sizes each worker keeps a scratch image for, a folder usually has one frame size
+SCRATCH_IMAGES = 4
+
+_scratch = threading.local()
+
+
+@lru_cache(maxsize=None)
+def load_font(font, size):
+    # each font and size is loaded once per process, pool workers keep theirs between panels
+    if font is None:
+        return ImageFont.load_default(size=size)
+    return ImageFont.truetype(font=font, size=size)
+
+
+@lru_cache(maxsize=TEXT_TILE_CACHE_SIZE)
+def text_tile(text, font, size, font_color, background_color):
+    """ Text drawn on the background color, tiles are shared between panels so only ever paste them """
+    text_font = load_font(font, size)
+    left, top, right, bottom = text_font.getbbox(text)
+    tile = Image.new("RGB", (right, bottom), color=background_color)
+    draw = ImageDraw.Draw(tile)
+    draw.text((0, 0), text, fill=font_color, font=text_font)
+    return tile
+
+
+def scratch_image(size):
+    """ A reused RGB image of size, its pixels are left over and it is only valid until the next call on this thread """
+    images = getattr(_scratch, "images", None)
+    if images is None:
+        images = _scratch.images = OrderedDict()
+    image = images.pop(size, None)
+    if image is None:
+        image = Image.new("RGB", size)
+    images[size] = image
+    while len(images) > SCRATCH_IMAGES:
+        images.popitem(last=False)
+    return image
+
+
+def footer_tile(job: PanelJob, style: PanelStyle, panel_width, panel_height):
+    """ The frame number tile and where its top left corner goes on a panel """
+    text_image = text_tile(f"{job.frame}", style.font, style.footer_font_size, job.font_color, job.background_color)
+    footer_text_x = int((panel_width - text_image.width) / 2)  # Center the text
+    footer_text_y = panel_height - text_image.height - style.footer_text_padding
+    return text_image, (footer_text_x, footer_text_y)
+
+
+def panel_overlays(job: PanelJob, style: PanelStyle, panel_width, panel_height):
+    if not style.add_footer:
+        return ()
+    text_image, (x, y) = footer_tile(job, style, panel_width, panel_height)
+    return PanelOverlay(encode_jpeg(text_image), x, y, text_image.width, text_image.height),
+
+
+def composite_panel(original_image: Image.Image, job: PanelJob, style: PanelStyle, add_footer_text=True):
+
+    # todo: allow user to adjust these settings at runtime
+    header_padding = style.header_padding if style.add_header else 0
+    footer_padding = style.footer_padding if style.add_footer else 0
+    header_text_padding = style.header_text_padding if style.add_header else 0
+
+    font_color = job.font_color
+    background_color = job.background_color
+
+    ########################################
+
+    original_width, original_height = original_image.size
+
+    header_text = f"{job.episode}_{job.scene}"
+
+    # Add space for text and some padding
+    total_height = original_height + header_padding + footer_padding
+
+    # Reuse this worker's image of the same size, the panel is encoded before the next one is composited
+    new_image = scratch_image((original_width, int(total_height)))
+
+    # Only the header and footer strips show the background, the original image covers the rest
+    new_image.paste(background_color, (0, 0, original_width, header_padding))
+    new_image.paste(background_color, (0, header_padding + original_height, original_width, int(total_height)))
+
+    # Paste the original image below the header
+    new_image.paste(original_image, (0, header_padding))
+
+    # Add text above
+    if style.add_header:
+        text_image = text_tile(header_text, style.font, style.header_font_size, font_color, background_color)
+        header_text_x = int((original_width - text_image.width) / 2)  # Center the text
+        new_image.paste(text_image, (header_text_x, header_text_padding))
+
+    # Add text below
+    if style.add_footer and add_footer_text:
+        text_image, footer_text_position = footer_tile(job, style, original_width, total_height)
+        new_image.paste(text_image, footer_text_position)
+
+    return new_image
+
+
+def encode_jpeg(image: Image.Image):
+    buffer = BytesIO()
+    image.save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+def encode_panel_image(new_image: Image.Image, job: PanelJob, style: PanelStyle, timings=None):
+    """ Encode a panel composited without its footer text, the text goes into overlays """
+    timings = [] if timings is None else timings
+    with stage(timings, "encode"):
+        data = encode_jpeg(new_image)
+    with stage(timings, "text"):
+        overlays = panel_overlays(job, style, new_image.width, new_image.height)
+
+    new_image_path = None
+    if job.export_panels:
+        with stage(timings, "export"):
+            # exported panels are whole images, the footer is pasted in after the shared image is encoded
+            if style.add_footer:
+                text_image, footer_text_position = footer_tile(job, style, new_image.width, new_image.height)
+                new_image.paste(text_image, footer_text_position)
+            new_image_path = export_panel_image(encode_jpeg(new_image), job, style)
+    return PanelImage(data, new_image.width, new_image.height, new_image_path, overlays)
+
+
+def export_panel_image(data: bytes, job: PanelJob, style: PanelStyle):
+    # create panel dir if not exists
+    panel_dir = f"{os.path.dirname(job.my_dir)}/panels/{style.name}"
+    if not os.path.exists(panel_dir):
+        os.makedirs(panel_dir, exist_ok=True)
+
+    # write the encoded bytes as they are
+    new_image_path = f"{panel_dir}/{job.frame}_{job.episode}_{job.scene}.jpg"
+    with open(new_image_path, "wb") as panel_file:
+        panel_file.write(data)
+    return new_image_path
+
+
+def fit_size(size, max_size):
+    width, height = size
+    if not max_size or max(width, height) <= max_size:
+        return size
+    scale = max_size / max(width, height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def scale_panel(image: Image.Image, size):
+    if size == image.size:
+        return image
+    # reducing_gap lets resize() reduce() by a whole factor first and only resample the remainder
+    return image.resize(size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+
+def render_panel(job: PanelJob, styles: dict[str, PanelStyle] = PANEL_STYLES, data: bytes | None = None):
+    """
+    Return the panel images of every style and the (stage, seconds) timings of this panel.
+    - data is the source file when it was read ahead, otherwise the worker maps it
+    """
+    timings = []
+    # decode the source once and build every requested variant from the same pixels
+    with open_source(f"{job.my_dir}/{job.file_name}", data) as original_image:
+        source_size = original_image.size
+        with stage(timings, "decode"):
+            # JPEGs are decoded at 1/2, 1/4 or 1/8 scale when every style asks for a smaller panel
+            max_sizes = [style.max_size for style in styles.values()]
+            if all(max_sizes):
+                original_image.draft(None, fit_size(source_size, max(max_sizes)))
+            original_image.load()
+        panel_images = {}
+        for name, style in styles.items():
+            with stage(timings, "scale"):
+                # sized from the source, not the draft, so a panel's size follows from the header alone
+                scaled_image = scale_panel(original_image, fit_size(source_size, style.max_size))
+            with stage(timings, "composite"):
+                new_image = composite_panel(scaled_image, job, style, add_footer_text=False)
+            panel_images[name] = encode_panel_image(new_image, job, style, timings)
+        return panel_images, timings
+
+
+class InlineExecutor(Executor):
+    """ Runs every task on the submitting thread, so a profiler on that thread sees the whole render """
+
+    def submit(self, fn, /, *args, **kwargs):
+        future = Future()
+        future.set_running_or_notify_cancel()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+def file_digest(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as source_file:
+        for chunk in iter(lambda: source_file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.digest()
+
+
+class HeldFrames:
+    """
+    Recently submitted panels by source content, so a held cel is composited once for all its frames.
+    - only a source whose size and header match a recent panel is hashed, unique frames never are
+    - the last max_entries panels are kept, holds are runs of consecutive frames
+    - a future keeps its panel's encoded images of every style, the window holds max_entries panels in memory
+    """
+
+    def __init__(self, max_entries=HELD_FRAME_WINDOW):
+        self.max_entries = max_entries
+        # (source size, episode, scene) -> [[source path, digest or None until compared, future], ...]
+        self.entries: OrderedDict[tuple, list] = OrderedDict()
+        self.count = 0
+        self.duplicates = 0
+
+    def find(self, job: PanelJob, size, data: bytes | None = None):
+        """ The future of a recent panel with the same source bytes and header, or None """
+        candidates = self.entries.get((size, job.episode, job.scene))
+        if not candidates:
+            return None
+        if data is not None:
+            digest = hashlib.sha1(data).digest()
+        else:
+            digest = file_digest(os.path.join(job.my_dir, job.file_name))
+        for candidate in candidates:
+            if candidate[1] is None:
+                candidate[1] = file_digest(candidate[0])
+            if candidate[1] == digest:
+                self.duplicates += 1
+                return candidate[2]
+        return None
+
+    def add(self, job: PanelJob, size, future: Future):
+        key = (size, job.episode, job.scene)
+        self.entries.setdefault(key, []).append([os.path.join(job.my_dir, job.file_name), None, future])
+        self.entries.move_to_end(key)
+        self.count += 1
+        while self.count > self.max_entries:
+            _, removed = self.entries.popitem(last=False)
+            self.count -= len(removed)
+
+
+@dataclass
+class SourceRead:
+    job: PanelJob
+    source_stat: tuple[int, int] | None
+    cached: dict[str, PanelImage] | None
+    size: int | None  # of the source file, None for a cache hit or an unreadable source
+    data: bytes | None  # the source file when it was read ahead, large sources are mapped by the worker
+    timings: list[tuple[str, float]]
+
+
+class SourceReader:
+    """
+    Pulls jobs and reads their sources on its own thread, so file I/O overlaps the pool's compositing.
+    - the queue holds at most max_ahead reads, a full queue blocks the thread until the pool catches up
+    - cache lookups happen here too, a hit never reads the source
+    - get() raises whatever the jobs iterator raised, stop() lets the thread go without waiting for it
+    """
+
+    def __init__(self, jobs, styles: dict[str, PanelStyle], cache=None, max_ahead=1):
+        self.jobs = iter(jobs)
+        self.styles = styles
+        self.cache = cache
+        self.done = False
+        self._queue = queue.Queue(maxsize=max_ahead)
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+
+    def get(self, block=True):
+        """ The next SourceRead in job order, None once the jobs are exhausted, queue.Empty if not block """
+        if self.done:
+            return None
+        item = self._queue.get(block=block)
+        if item is None:
+            self.done = True
+        elif isinstance(item, BaseException):
+            self.done = True
+            raise item
+        return item
+
+    def _run(self):
+        try:
+            for job in self.jobs:
+                if not self._put(self.read(job)):
+                    return
+        except BaseException as e:
+            self._put(e)
+        else:
+            self._put(None)
+
+    def _put(self, item):
+        while not self._stopped.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def read(self, job: PanelJob):
+        timings = []
+        source_stat = self.cache.source_stat(job) if self.cache else None
+        # exported panels carry their frame number, so they are always composited whole
+        if self.cache and not job.export_panels:
+            with stage(timings, "cache_read"):
+                cached = self.cache.get_all(job, self.styles, source_stat)
+            if cached:
+                return SourceRead(job, source_stat, cached, None, None, timings)
+
+        start = time.perf_counter()
+        try:
+            size, data = read_source(os.path.join(job.my_dir, job.file_name))
+        except OSError:
+            # the worker opens it again and reports the error
+            size, data = None, None
+        timings.append(("read", time.perf_counter() - start))
+        return SourceRead(job, source_stat, None, size, data, timings)
+
+
+class RenderEngine:
+    """
+    Renders panel images on a pool of worker processes.
+    - results are yielded in job order so the PDFs are always written deterministically
+    - on_panel_done is called (from a pool thread) as soon as each panel finishes rendering
+    - pass a shared executor to run several renders on one pool, workers should then match its size
+    - a SourceReader thread reads the sources ahead of the pool, at most READ_AHEAD_PER_WORKER per worker,
+      sources of MMAP_MIN_BYTES or more are only prefetched and mapped by the worker decoding them
+    - with a RenderCache, panels whose source and settings are unchanged are served without decoding
+    - with RenderStats, the read, decode, composite and encode time of every rendered panel is added to it
+    - a frame whose source is byte-identical to a recent one reuses its panel images with its own frame number
+    - use it as a context manager to keep one pool for several render() calls
+    """
+
+    def __init__(self, workers=None, on_panel_done=None, styles: dict[str, PanelStyle] = PANEL_STYLES, executor=None,
+                 cache=None, stats: RenderStats | None = None):
+        self.workers = max(1, workers or default_workers())
+        self.styles = styles
+        self.executor = executor
+        self.cache = cache
+        self.stats = stats
+        self._own_executor = None
+        self.on_panel_done = on_panel_done
+        # keep a few panels in flight per worker, not the whole folder
+        self.window = self.workers * 4
+        self.held_frames = HeldFrames()
+
+    def _panel_done(self, job, future):
+        if self.on_panel_done and not future.cancelled() and future.exception() is None:
+            self.on_panel_done(job)
+
+    def _held_frame_done(self, job, held_future, future):
+        if held_future.cancelled():
+            future.cancel()
+        elif not future.set_running_or_notify_cancel():
+            # stopped while the held panel was rendering
+            return
+        elif held_future.exception() is not None:
+            future.set_exception(held_future.exception())
+        else:
+            panel_images, _ = held_future.result()
+            future.set_result(({
+                name: replace(panel_image, path=None,
+                              overlays=panel_overlays(job, self.styles[name], panel_image.width, panel_image.height))
+                for name, panel_image in panel_images.items()
+            }, ()))
+
+    def __enter__(self):
+        if not self.executor:
+            # the process pool module loads with the first render, concurrent.futures imports it lazily too
+            from concurrent.futures import ProcessPoolExecutor
+            self._own_executor = self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._own_executor:
+            self._own_executor.shutdown()
+            self._own_executor = self.executor = None
+
+    def render(self, jobs, should_stop=lambda: False):
+        if self.executor:
+            yield from self._render(self.executor, jobs, should_stop)
+            return
+
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            yield from self._render(executor, jobs, should_stop)
+
+    def _render(self, executor, jobs, should_stop):
+        pending = deque()
+
+        styles = self.styles
+        reader = SourceReader(jobs, styles, self.cache, self.workers * READ_AHEAD_PER_WORKER).start()
+
+        def submit(read: SourceRead):
+            job = read.job
+            if self.stats:
+                self.stats.add_all(read.timings)
+            if read.cached:
+                future = Future()
+                future.set_result(({
+                    name: replace(panel_image,
+                                  overlays=panel_overlays(job, styles[name], panel_image.width, panel_image.height))
+                    for name, panel_image in read.cached.items()
+                }, ()))
+            else:
+                future = self._submit(executor, job, read.size, read.data)
+
+            future.add_done_callback(lambda f: self._panel_done(job, f))
+            pending.append((job, future, bool(read.cached), read.source_stat))
+
+        def submit_ready():
+            # top the window up with whatever has been read, only wait for the reader when nothing is in flight
+            while len(pending) < self.window:
+                try:
+                    read = reader.get(block=not pending)
+                except queue.Empty:
+                    return
+                if read is None:
+                    return
+                submit(read)
+
+        try:
+            while True:
+                submit_ready()
+                if not pending or should_stop():
+                    break
+
+                job, future, cached, source_stat = pending.popleft()
+                result, timings = future.result()
+                if self.stats:
+                    self.stats.add_all(timings)
+                if self.cache and not cached:
+                    self.cache.put_all(job, styles, result, source_stat)
+                yield job, result
+        finally:
+            reader.stop()
+            # drop whatever is still queued, a shared pool keeps running other renders
+            for _, future, _, _ in pending:
+                future.cancel()
+
+    def _submit(self, executor, job: PanelJob, size: int | None, data: bytes | None = None):
+        if size is None:
+            # the render reports the missing source
+            return executor.submit(render_panel, job, self.styles)
+
+        held_future = None if job.export_panels else self.held_frames.find(job, size, data)
+        if not held_future:
+            future = executor.submit(render_panel, job, self.styles, data)
+            self.held_frames.add(job, size, future)
+            return future
+
+        future = Future()
+        held_future.add_done_callback(lambda f: self._held_frame_done(job, f, future))
+        return future
@@ -0,0 +1,82 @@
+from dataclasses import dataclass
+
+
+# Events a render reports through its on_event callback.
+# They are plain data so a worker thread can hand them to the GUI through a queue without touching Tk.
+
+@dataclass(frozen=True)
+class PanelStarted:
+    index: int
+
+
+@dataclass(frozen=True)
+class PanelRendered:
+    index: int
+
+
+@dataclass(frozen=True)
+class PanelDone:
+    index: int
+
+
+@dataclass(frozen=True)
+class PageFlushed:
+    page: int
+
+
+@dataclass(frozen=True)
+class RenderError:
+    message: str
+    details: str
+
+
+@dataclass(frozen=True)
+class RenderFinished:
+    pdf_singles_save_path: str | None  # None when the render writes no singles PDF
+    pdf_grid_save_path: str | None
+    stopped: bool
+    held_frames: int = 0  # panels that reused a byte-identical frame's images
+    duplicate_bytes: int = 0  # image bytes shared instead of written again
+
+
+@dataclass(frozen=True)
+class StageStats:
+    stages: dict  # RenderStats.as_dict() so far
+
+
+@dataclass(frozen=True)
+class JobProgress:
+    job_id: int
+    name: str
+    state: str
+    done: int
+    total: int
+
+
+@dataclass(frozen=True)
+class QueueFinished:
+    pending: int
+
+
+@dataclass(frozen=True)
+class PanelsScanned:
+    my_dir: str
+    found: int
+
+
+@dataclass(frozen=True)
+class ScanFinished:
+    my_dir: str
+    panels: list
+    error: str | None
+
+
+@dataclass(frozen=True)
+class FramesChanged:
+    my_dir: str
+    changed: list  # file names added, changed or removed since the last render
+
+
+@dataclass(frozen=True)
+class WatchStopped:
+    my_dir: str
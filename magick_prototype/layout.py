@@ -0,0 +1,91 @@
+from dataclasses import dataclass, field, replace
+
+# grid settings of every layout, apply_layout() puts them into RenderSettings
+LAYOUTS = {
+    "3x3": dict(panel_rows=3, panel_columns=3),
+    "2x2": dict(panel_rows=2, panel_columns=2),
+    "4x3": dict(panel_rows=3, panel_columns=4),
+    "4x4": dict(panel_rows=4, panel_columns=4),
+    # many small panels a page, for reading a whole sequence at a glance
+    "Contact Sheet": dict(panel_rows=6, panel_columns=8, page_padding=40, panel_padding=15, grid_max_size=480),
+    "One Per Page": dict(panel_rows=1, panel_columns=1),
+}
+# portrait sizes in points, a grid page is fitted in whichever orientation shows it larger
+PAPER_SIZES = {
+    "A4": (595, 842),
+    "Letter": (612, 792),
+}
+
+
+def apply_layout(settings, name):
+    """ settings with the grid of layout name, a grid_max_size already smaller than the layout's is kept """
+    values = dict(LAYOUTS[name])
+    if "grid_max_size" in values and settings.grid_max_size:
+        values["grid_max_size"] = min(values["grid_max_size"], settings.grid_max_size)
+    return replace(settings, **values)
+
+
+@dataclass(frozen=True)
+class PageLayout:
+    """
+    The geometry of every grid page of a render, computed once before its first page is written.
+    - slots holds the bottom left corner of every cell in slot order, 0 x 0 is the bottom left of the page
+    - content_size is the page laid out at 1pt per pixel of the first panel, on paper it is scaled by scale
+      and moved by origin to fit page_size
+    - a panel of another size is scaled into its cell and centered, place() remembers the fit of every size
+    """
+    page_size: tuple[float, float]
+    content_size: tuple[float, float]
+    cell_size: tuple[int, int]
+    slots: tuple[tuple[int, int], ...]
+    scale: float = 1.0
+    origin: tuple[float, float] = (0, 0)
+    # (panel width, height) -> (x, y, width, height) of the panel within its cell
+    fits: dict = field(default_factory=dict, compare=False, repr=False)
+
+    def place(self, slot, width, height):
+        """ (x, y, width, height) the panel of slot is drawn at, in content coordinates """
+        fit = self.fits.get((width, height))
+        if fit is None:
+            fit = self.fits[(width, height)] = self.fit(width, height)
+        x, y = self.slots[slot]
+        return x + fit[0], y + fit[1], fit[2], fit[3]
+
+    def fit(self, width, height):
+        cell_width, cell_height = self.cell_size
+        if (width, height) == (cell_width, cell_height):
+            return 0, 0, width, height
+        scale = min(cell_width / width, cell_height / height)
+        fit_width, fit_height = width * scale, height * scale
+        return (cell_width - fit_width) / 2, (cell_height - fit_height) / 2, fit_width, fit_height
+
+
+def grid_layout(settings, cell_size) -> PageLayout:
+    """ The PageLayout of settings' grid with cells of cell_size, fitted to settings.paper when it is set """
+    cell_width, cell_height = cell_size
+    rows, columns = settings.panel_rows, settings.panel_columns
+    page_width = (cell_width * columns) + (settings.panel_padding * (columns - 1)) + (settings.page_padding * 2)
+    page_height = (
+            (cell_height * rows) +
+            (settings.panel_padding * (rows - 1)) +
+            (settings.page_padding * 2) +
+            settings.page_title_padding +
+            settings.page_footer_padding
+    )
+    slots = tuple(
+        (settings.page_padding + (cell_width + settings.panel_padding) * column,
+         page_height - settings.page_padding - settings.page_title_padding - cell_height -
+         (cell_height + settings.panel_padding) * row)
+        for row in range(rows) for column in range(columns)
+    )
+    layout = PageLayout((page_width, page_height), (page_width, page_height), cell_size, slots)
+    if not settings.paper:
+        return layout
+
+    portrait = PAPER_SIZES[settings.paper]
+    scale, paper_size = max(
+        (min(paper_width / page_width, paper_height / page_height), (paper_width, paper_height))
+        for paper_width, paper_height in (portrait, portrait[::-1])
+    )
+    origin = ((paper_size[0] - page_width * scale) / 2, (paper_size[1] - page_height * scale) / 2)
+    return replace(layout, page_size=paper_size, scale=scale, origin=origin)
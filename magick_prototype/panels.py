@@ -0,0 +1,149 @@
+import os
+import re
+import threading
+import time
+from operator import attrgetter
+from magick_prototype.sources import probe_size
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+DIGITS = re.compile(r'(\d+)')
+
+
+def natural_key(text: str):
+    """ Sort key that orders the digit runs of text by value, so "9" comes before "10" """
+    # re.split with a group alternates text and digits, so ints are only ever compared with ints
+    return tuple(int(part) if i % 2 else part.lower() for i, part in enumerate(DIGITS.split(text)))
+
+
+class Panel:
+    """
+    A frame_episode_scene image, parsed once when it is found.
+    - frame, episode and scene keep the text of the file name, missing parts are 'Undefined'
+    - panels sort naturally by frame, then episode and scene, then by file name
+    - size is the (width, height) read from the header by a probing scan, readable is False when it could not be,
+      the grid pages of a render are laid out from its first panel's size
+    """
+
+    __slots__ = ('file_name', 'frame', 'episode', 'scene', 'sort_key', 'size', 'readable')
+
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+
+        # get the basename of the Image
+        # split the basename by the underscore
+        image_basename = os.path.basename(file_name)
+        image_basename = os.path.splitext(image_basename)[0]
+        name_parts = image_basename.split('_', 3)
+        name_parts += ['Undefined'] * (3 - len(name_parts))
+        self.frame, self.episode, self.scene = name_parts[:3]
+        self.sort_key = (natural_key(self.frame), natural_key(self.episode), natural_key(self.scene), file_name)
+        self.size: tuple[int, int] | None = None
+        self.readable = True
+
+    def __str__(self):
+        return f"Episode: {self.episode}, Scene: {self.scene}, Frame: {self.frame}:end"
+
+    def __lt__(self, other):
+        return self.sort_key < other.sort_key
+
+
+def sort_panels(panels) -> list[Panel]:
+    return sorted(panels, key=attrgetter('sort_key'))
+
+
+class PanelScan:
+    """
+    Finds the panels of a folder with os.scandir, in batches as the directory is read.
+    - on_batch(panels) is called from the scanning thread for every batch found, unsorted
+    - on_finished(panels, error) is called with the sorted panels before wait() returns
+    - batches() can be consumed by any number of readers while the scan is still running
+    - with probe, the header of every panel is read for its size, a frame that is not an image is found
+      before anything is rendered
+    """
+
+    def __init__(self, my_dir, batch_size=500, on_batch=None, on_finished=None, probe=False):
+        self.my_dir = my_dir
+        self.batch_size = batch_size
+        self.probe = probe
+        self.on_batch = on_batch or (lambda panels: None)
+        self.on_finished = on_finished or (lambda panels, error: None)
+        self.error: OSError | None = None
+        self.seconds = 0.0  # listing and sorting time once finished
+        self._found: list[Panel] = []
+        self._panels: list[Panel] = []
+        self._finished = False
+        self._condition = threading.Condition()
+
+    @property
+    def done(self):
+        return self._finished
+
+    def start(self):
+        threading.Thread(target=self.run, daemon=True).start()
+        return self
+
+    def run(self):
+        start = time.perf_counter()
+        try:
+            batch: list[Panel] = []
+            with os.scandir(self.my_dir) as entries:
+                for entry in entries:
+                    # check if the item is an image file
+                    if not entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                        continue
+                    panel = Panel(entry.name)
+                    if self.probe:
+                        try:
+                            panel.size = probe_size(entry.path)
+                        except OSError:
+                            # PIL's UnidentifiedImageError is an OSError too
+                            panel.readable = False
+                    batch.append(panel)
+                    if len(batch) >= self.batch_size:
+                        self._add_batch(batch)
+                        batch = []
+            if batch:
+                self._add_batch(batch)
+        except OSError as e:
+            self.error = e
+        finally:
+            panels = sort_panels(self._found)
+            self.seconds = time.perf_counter() - start
+            self.on_finished(panels, self.error)
+            with self._condition:
+                self._panels = panels
+                self._finished = True
+                self._condition.notify_all()
+        return self
+
+    def _add_batch(self, batch):
+        with self._condition:
+            self._found.extend(batch)
+            self._condition.notify_all()
+        self.on_batch(batch)
+
+    def batches(self):
+        position = 0
+        while True:
+            with self._condition:
+                while position >= len(self._found) and not self._finished:
+                    self._condition.wait()
+                batch = self._found[position:]
+                position = len(self._found)
+                finished = self._finished
+            if batch:
+                yield batch
+            elif finished:
+                return
+
+    def wait(self) -> list[Panel]:
+        with self._condition:
+            while not self._finished:
+                self._condition.wait()
+        if self.error:
+            raise self.error
+        return self._panels
+
+
+def list_panels(my_dir) -> list[Panel]:
+    return PanelScan(my_dir).run().wait()
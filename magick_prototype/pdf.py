@@ -0,0 +1,107 @@
+import hashlib
+import os
+import shutil
+from io import BytesIO
+
+# encoded panels gathered into each partial PDF written by the pool, ReportLab keeps them all until save()
+DEFAULT_SHARD_MAX_BYTES = 32 * 1024 ** 2
+
+
+def merge_pdfs(paths, out_path, keep_inputs=False):
+    """
+    Concatenates the pages of PDFs into out_path one object at a time and returns the bytes it did not repeat.
+    - only one input is parsed at once, memory follows the largest input, not the output
+    - objects are written after everything they refer to, so one identical to an earlier object,
+      like a held cel's image in another input, is replaced by a reference to it
+    - meant for the flat ReportLab files written here, outlines and forms of other PDFs are dropped
+    - a single input is moved to out_path unless keep_inputs
+    """
+    if len(paths) == 1:
+        if keep_inputs:
+            shutil.copyfile(paths[0], f"{out_path}.tmp")
+            os.replace(f"{out_path}.tmp", out_path)
+        else:
+            os.replace(paths[0], out_path)
+        return 0
+
+    # pypdf is only needed once a render merges, not to open the window
+    from pypdf import PdfReader
+    from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject
+
+    tmp_path = f"{out_path}.tmp"
+    offsets = [0, 0, 0]  # object number -> file offset, 1 is the page tree and 2 the catalog
+    written = {}  # digest of an object as written -> its number
+    page_numbers = []
+    info_number = None
+    duplicate_bytes = 0
+
+    with open(tmp_path, "wb") as out:
+        out.write(b"%PDF-1.4\n%\x93\x8c\x8b\x9e\n")
+
+        for path in paths:
+            reader = PdfReader(path)
+            numbers = {}  # input object number -> output object number
+
+            def renumber(obj):
+                if isinstance(obj, IndirectObject):
+                    return IndirectObject(write_object(obj.idnum), 0, None)
+                if isinstance(obj, (DictionaryObject, ArrayObject)):
+                    for key, value in list(obj.items()):
+                        obj[key] = renumber(value)
+                return obj
+
+            def write_object(idnum):
+                nonlocal duplicate_bytes
+                if idnum in numbers:
+                    if numbers[idnum] is None:
+                        raise ValueError(f"{path}: object {idnum} refers back to itself")
+                    return numbers[idnum]
+                numbers[idnum] = None
+
+                obj = reader.get_object(idnum)
+                is_page = isinstance(obj, DictionaryObject) and obj.get("/Type") == "/Page"
+                if is_page:
+                    # pages are re-parented to the merged page tree, the input's own tree is never copied
+                    del obj["/Parent"]
+                renumber(obj)
+                if is_page:
+                    obj[NameObject("/Parent")] = IndirectObject(1, 0, None)
+
+                buffer = BytesIO()
+                obj.write_to_stream(buffer)
+                data = buffer.getvalue()
+                digest = hashlib.sha1(data).digest()
+                # every page needs its own object, anything else identical is shared
+                if not is_page and digest in written:
+                    duplicate_bytes += len(data)
+                    numbers[idnum] = written[digest]
+                    return numbers[idnum]
+
+                number = len(offsets)
+                offsets.append(out.tell())
+                out.write(f"{number} 0 obj\n".encode())
+                out.write(data)
+                out.write(b"\nendobj\n")
+                written[digest] = numbers[idnum] = number
+                return number
+
+            for page in reader.pages:
+                page_numbers.append(write_object(page.indirect_reference.idnum))
+            if info_number is None and "/Info" in reader.trailer:
+                info_number = write_object(reader.trailer.raw_get("/Info").idnum)
+
+        offsets[1] = out.tell()
+        kids = " ".join(f"{number} 0 R" for number in page_numbers)
+        out.write(f"1 0 obj\n<< /Type /Pages /Count {len(page_numbers)} /Kids [ {kids} ] >>\nendobj\n".encode())
+        offsets[2] = out.tell()
+        out.write(b"2 0 obj\n<< /Type /Catalog /Pages 1 0 R >>\nendobj\n")
+
+        xref_offset = out.tell()
+        out.write(f"xref\n0 {len(offsets)}\n0000000000 65535 f \n".encode())
+        for offset in offsets[1:]:
+            out.write(f"{offset:010d} 00000 n \n".encode())
+        info = f" /Info {info_number} 0 R" if info_number is not None else ""
+        out.write(f"trailer\n<< /Size {len(offsets)} /Root 2 0 R{info} >>\nstartxref\n{xref_offset}\n%%EOF\n".encode())
+
+    os.replace(tmp_path, out_path)
+    return duplicate_bytes
@@ -0,0 +1,36 @@
+import threading
+import time
+from magick_prototype.events import PanelDone
+
+
+class ProgressThrottle:
+    """
+    Counts PanelDone events from any thread and publishes the running total.
+    - publish(done) is called at most every interval seconds, call flush() once the render is over
+    """
+
+    def __init__(self, publish, interval=0.1):
+        self.publish = publish
+        self.interval = interval
+        self.done = 0
+        self._published = 0
+        self._last_publish = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        if not isinstance(event, PanelDone):
+            return
+        with self._lock:
+            self.done += 1
+            if time.monotonic() - self._last_publish >= self.interval:
+                self._publish()
+
+    def flush(self):
+        with self._lock:
+            self._publish()
+
+    def _publish(self):
+        self._last_publish = time.monotonic()
+        if self.done != self._published:
+            self._published = self.done
+            self.publish(self.done)
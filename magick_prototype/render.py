@@ -0,0 +1,425 @@
+import cProfile
+import dataclasses
+import glob
+import hashlib
+import os
+import traceback
+from collections import deque
+from dataclasses import dataclass, replace
+from magick_prototype.cache import DEFAULT_CACHE_MAX_BYTES, RenderCache
+from magick_prototype.checkpoint import Checkpoint, ShardRecord
+from magick_prototype.engine import PANEL_STYLES, InlineExecutor, PanelJob, PanelStyle, RenderEngine
+from magick_prototype.events import (PageFlushed, PanelDone, PanelRendered, PanelStarted, RenderError, RenderFinished,
+                                     StageStats)
+from magick_prototype.layout import PageLayout, grid_layout
+from magick_prototype.panels import Panel, PanelScan
+from magick_prototype.pdf import DEFAULT_SHARD_MAX_BYTES, merge_pdfs
+from magick_prototype.sources import probe_size
+from magick_prototype.stats import RenderStats
+from magick_prototype.themes import THEMES, Theme
+
+
+@dataclass
+class RenderSettings:
+    name: str
+    font_color: tuple[int, int, int] = THEMES["Dark"].font_color
+    background_color: tuple[int, int, int] = THEMES["Dark"].background_color
+    include_filename: bool = True
+    export_panels: bool = False
+    workers: int | None = None
+    use_cache: bool = True
+    cache_max_bytes: int = DEFAULT_CACHE_MAX_BYTES
+    shard_max_bytes: int = DEFAULT_SHARD_MAX_BYTES
+    # longest side of a panel's frame in pixels, None keeps the source resolution,
+    # panels are placed at 1pt per pixel so this is also the PDF's resolution
+    single_max_size: int | None = None
+    grid_max_size: int | None = None
+    # write <name>_profile.json and <name>_profile.csv with the stage timings next to the PDFs
+    write_profile: bool = False
+    # render on the calling thread under cProfile and write <name>.prof next to the PDFs, much slower
+    cprofile: bool = False
+    # reuse the shards recorded in <name>.checkpoint.json whose settings and frames are unchanged
+    resume: bool = False
+    # keep the shards after a complete render, so the next one with resume only rewrites the pages that changed
+    keep_shards: bool = False
+    # what the render writes, any of OUTPUTS, a panel style only the outputs left out need is never rendered
+    outputs: tuple[str, ...] = ("singles", "grid")
+
+    # GRID PDF SETTINGS
+    page_padding: int = 50
+    page_title_padding: int = 100
+    page_footer_padding: int = 70
+    panel_padding: int = 50
+    panel_rows: int = 3
+    panel_columns: int = 3
+    # fit every grid page onto A4 or Letter, None sizes the pages to the panels
+    paper: str | None = None
+
+    @classmethod
+    def from_theme(cls, theme: Theme, **kwargs):
+        return cls(font_color=theme.font_color, background_color=theme.background_color, **kwargs)
+
+
+# singles and grid are the two PDFs, sequence is <name>_sequence/ with every single panel as a numbered JPEG
+# and contact is <name>_contact/ with every grid page as a PNG
+OUTPUTS = ("singles", "grid", "sequence", "contact")
+# the panel style each output is drawn from
+OUTPUT_STYLES = {"singles": "single", "grid": "grid", "sequence": "single", "contact": "grid"}
+
+# settings that only change how a render runs, not what it writes, a checkpoint ignores them
+RUN_SETTINGS = ("workers", "use_cache", "cache_max_bytes", "shard_max_bytes", "write_profile", "cprofile", "resume",
+                "keep_shards")
+
+
+class PdfRenderer:
+    """
+    Writes <name>.pdf and <name>_grid.pdf for a folder of panels, no GUI required.
+    - on_event gets the magick_prototype.events as the render goes
+    - on_event is called from several threads and has to be thread-safe: PanelRendered comes from a render
+      pool thread, PanelStarted from the engine's SourceReader thread as it pulls each job, everything else
+      from the thread calling render()
+    - panels may be a running PanelScan, with the cache on its panels are composited as they are found
+      and the PDFs are written in order once the scan is done
+    - finished panels are gathered into PdfShards of whole grid pages, the pool writes each shard to partial
+      PDFs in parallel and they are merged in order once the last one is written
+    - peak memory is about (workers + 1) x shard_max_bytes of encoded panels waiting for the pool, plus
+      1.25 x shard_max_bytes in each worker writing a shard, 6 x workers small source files read ahead and
+      the encoded panels of the last HELD_FRAME_WINDOW frames kept for held cels, it does not grow with
+      the number of frames
+    - stats holds the timings of every stage, StageStats reports them as each shard is written
+    - every shard of whole grid pages is recorded in a Checkpoint and kept until the render completes,
+      with settings.resume the recorded shards whose frames are unchanged are merged in again instead of
+      rendered, so a stopped or failed render continues and a refresh only rewrites the pages that changed
+    """
+
+    def __init__(self, my_dir, panels: list[Panel] | PanelScan, settings: RenderSettings, target_dir=None,
+                 on_event=None, executor=None):
+        self.my_dir = my_dir
+        self.scan = panels if isinstance(panels, PanelScan) else None
+        self.panels = [] if self.scan else panels
+        self.settings = settings
+        self.on_event = on_event or (lambda event: None)
+        self.executor = executor
+
+        target_dir = target_dir or os.path.dirname(my_dir)
+        self.target_dir = target_dir
+        self.pdf_singles_save_path = f"{target_dir}/{settings.name}.pdf"
+        self.pdf_grid_save_path = f"{target_dir}/{settings.name}_grid.pdf"
+        self.profile_json_path = f"{target_dir}/{settings.name}_profile.json"
+        self.profile_csv_path = f"{target_dir}/{settings.name}_profile.csv"
+        self.cprofile_path = f"{target_dir}/{settings.name}.prof"
+        self.checkpoint_path = f"{target_dir}/{settings.name}.checkpoint.json"
+        self.sequence_dir = f"{target_dir}/{settings.name}_sequence"
+        self.contact_dir = f"{target_dir}/{settings.name}_contact"
+
+        # held cels composited once and image bytes not written again, for the run summary
+        self.held_frames = 0
+        self.stats = RenderStats()
+        self.duplicate_bytes = 0
+
+    def render(self, should_stop=lambda: False):
+        try:
+            if self.settings.cprofile:
+                stopped = self._profile(should_stop)
+            else:
+                stopped = self._render(should_stop)
+            if self.settings.write_profile:
+                self.stats.write_profile(self.profile_json_path, self.profile_csv_path)
+        except Exception as e:
+            self.on_event(RenderError(str(e), traceback.format_exc()))
+            raise
+        self.on_event(StageStats(self.stats.as_dict()))
+        outputs = self.settings.outputs
+        self.on_event(RenderFinished(self.pdf_singles_save_path if "singles" in outputs else None,
+                                     self.pdf_grid_save_path if "grid" in outputs else None, stopped,
+                                     self.held_frames, self.duplicate_bytes))
+
+    @property
+    def output_paths(self):
+        """ The files and folders the render writes, in OUTPUTS order """
+        paths = {"singles": self.pdf_singles_save_path, "grid": self.pdf_grid_save_path,
+                 "sequence": self.sequence_dir, "contact": self.contact_dir}
+        return [paths[output] for output in OUTPUTS if output in self.settings.outputs]
+
+    def _profile(self, should_stop):
+        # the pool's work is invisible to a profiler on this thread, so every panel and shard runs inline
+        executor, self.executor = self.executor, InlineExecutor()
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            try:
+                return self._render(should_stop)
+            finally:
+                profiler.disable()
+                profiler.dump_stats(self.cprofile_path)
+        finally:
+            self.executor = executor
+
+    def _job(self, index, panel: Panel):
+        settings = self.settings
+        return PanelJob(index, self.my_dir, panel.file_name, panel.frame, panel.episode, panel.scene,
+                        tuple(settings.font_color), tuple(settings.background_color), settings.export_panels)
+
+    def panel_styles(self) -> dict[str, PanelStyle]:
+        """ Every registered style with the settings' max sizes, less the styles of outputs left out """
+        max_sizes = {"single": self.settings.single_max_size, "grid": self.settings.grid_max_size}
+        needed = {OUTPUT_STYLES[output] for output in self.settings.outputs}
+        return {
+            name: replace(style, max_size=max_sizes[name]) if name in max_sizes else style
+            for name, style in PANEL_STYLES.items()
+            # a style no output draws from is rendered for its panel export
+            if name in needed or name not in OUTPUT_STYLES.values()
+        }
+
+    def fingerprint(self, layout: PageLayout | None = None):
+        """ Digest of everything but the panels that changes the PDFs """
+        settings = {key: value for key, value in dataclasses.asdict(self.settings).items() if key not in RUN_SETTINGS}
+        # the cells follow the first frame, a shard laid out for another first frame is never reused
+        cell_size = layout.cell_size if layout else None
+        return hashlib.sha1(repr((settings, self.panel_styles(), cell_size)).encode('utf-8')).hexdigest()
+
+    def source_stat(self, panel: Panel):
+        try:
+            stat = os.stat(os.path.join(self.my_dir, panel.file_name))
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _jobs(self, indices):
+        for index in indices:
+            # pulled by the engine's reader thread as the panel is read
+            self.on_event(PanelStarted(index))
+            yield self._job(index, self.panels[index])
+
+    def _scanned_jobs(self):
+        for batch in self.scan.batches():
+            for panel in batch:
+                if not panel.readable:
+                    continue
+                # exports are left to the ordered pass
+                yield replace(self._job(-1, panel), export_panels=False)
+
+    def _render(self, should_stop):
+        unknown = set(self.settings.outputs) - set(OUTPUTS)
+        if unknown or not self.settings.outputs:
+            raise ValueError(f"outputs must be some of {', '.join(OUTPUTS)}, got {self.settings.outputs!r}")
+        cache = RenderCache(self.target_dir, self.settings.cache_max_bytes) if self.settings.use_cache else None
+        styles = self.panel_styles()
+        engine = RenderEngine(
+            workers=self.settings.workers,
+            on_panel_done=lambda job: self.on_event(PanelRendered(job.index)),
+            styles=styles,
+            executor=self.executor,
+            cache=cache,
+            stats=self.stats,
+        )
+
+        with engine:
+            if self.scan:
+                # a resumed render only composites the panels after the checkpoint, once the scan has sorted them
+                resuming = self.settings.resume and os.path.exists(self.checkpoint_path)
+                if cache and not self.scan.done and not resuming:
+                    # composite into the cache while the scan runs, the ordered pass below then only reads it
+                    prerender = RenderEngine(workers=engine.workers, styles=styles, executor=engine.executor,
+                                             cache=cache, stats=self.stats)
+                    prerender.held_frames = engine.held_frames
+                    for _ in prerender.render(self._scanned_jobs(), should_stop=should_stop):
+                        pass
+                self.panels = self.scan.wait()
+                self.stats.add("scan", self.scan.seconds)
+            # a probing scan has already read every header, a frame that is not an image fails before any page
+            unreadable = [panel.file_name for panel in self.panels if not panel.readable]
+            if unreadable:
+                raise ValueError(f"{len(unreadable)} frames are not readable images: {', '.join(unreadable[:5])}")
+            self._write_pdfs(engine, should_stop)
+        self.held_frames = engine.held_frames.duplicates
+
+        if cache:
+            cache.evict()
+
+        return should_stop()
+
+    def _write_pdfs(self, engine: RenderEngine, should_stop):
+        # ReportLab loads with the first render instead of with the window
+        from magick_prototype.shard import PdfShard, write_shard
+
+        settings = self.settings
+        outputs = settings.outputs
+        panels = self.panels
+        panels_per_page = settings.panel_rows * settings.panel_columns
+        last_index = len(panels) - 1
+        # the image sinks are written into their folders by the shards, they are never merged
+        sink_dirs = (self.sequence_dir if "sequence" in outputs else None,
+                     self.contact_dir if "contact" in outputs else None)
+        for sink_dir in sink_dirs:
+            if sink_dir:
+                os.makedirs(sink_dir, exist_ok=True)
+
+        layout = self.page_layout()
+        fingerprint = self.fingerprint(layout)
+        source_stats = [self.source_stat(panel) for panel in panels]
+
+        def shard_digest(first_index, shard_last_index):
+            # a shard ending on a partial last page changes when frames are added after it
+            total = None if (shard_last_index + 1) % panels_per_page == 0 else len(panels)
+            parts = (fingerprint, first_index, shard_last_index, total,
+                     [(panels[index].file_name, source_stats[index])
+                      for index in range(first_index, shard_last_index + 1)])
+            return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+        checkpoint = Checkpoint.load(self.checkpoint_path, resume=settings.resume)
+        # a resume with other settings would find no shard to reuse and remove them all, they are kept for
+        # a resume with the settings they were written with instead
+        settings_fingerprint = self.fingerprint()
+        if checkpoint.shards and checkpoint.fingerprint != settings_fingerprint:
+            raise ValueError(f"{self.checkpoint_path} was written with other settings, resume with those "
+                             f"or render again without resume to start over")
+        checkpoint.fingerprint = settings_fingerprint
+        reused = deque(checkpoint.retain([
+            record for record in checkpoint.shards
+            if record.last_index <= last_index and record.digest == shard_digest(record.first_index,
+                                                                                 record.last_index)
+        ]))
+        # shards of a killed render that were never recorded are written again
+        stale_paths = [glob.glob(f"{glob.escape(path)}.*.part")
+                       for path in (self.pdf_singles_save_path, self.pdf_grid_save_path)]
+        self._remove_shards(stale_paths, keep=checkpoint)
+
+        reused_indices = set()
+        for record in reused:
+            reused_indices.update(range(record.first_index, record.last_index + 1))
+            for index in range(record.first_index, record.last_index + 1):
+                self.on_event(PanelDone(index))
+            self.on_event(PageFlushed(record.last_index // panels_per_page + 1))
+        indices = [index for index in range(len(panels)) if index not in reused_indices]
+
+        shard = None
+        shard_paths: list[tuple[str | None, str | None]] = []  # in page order, reused and new
+        writing = deque()  # shards being written by the pool, oldest first
+
+        def add_reused(before_index):
+            while reused and reused[0].first_index < before_index:
+                record = reused.popleft()
+                shard_paths.append((record.singles_path, record.grid_path))
+
+        def submit_shard():
+            first_index, shard_last_index = shard.panels[0][0], shard.panels[-1][0]
+            # only a shard of whole grid pages can be reused, a stopped run's partial page is written again
+            record = None
+            if (shard_last_index + 1) % panels_per_page == 0 or shard_last_index == last_index:
+                record = ShardRecord(shard.singles_path, shard.grid_path, first_index, shard_last_index,
+                                     shard_digest(first_index, shard_last_index))
+            writing.append((engine.executor.submit(write_shard, shard), record))
+            # the main process only holds the shards the pool has not picked up yet
+            while len(writing) > engine.workers:
+                self._shard_written(checkpoint, *writing.popleft())
+
+        try:
+            for job, panel_images in engine.render(self._jobs(indices), should_stop=should_stop):
+                if shard and job.index != shard.panels[-1][0] + 1:
+                    # a reused shard comes next, the open one ends on the grid page before it
+                    submit_shard()
+                    shard = None
+
+                if not shard:
+                    add_reused(job.index)
+                    # named by their first panel, a shard rewritten after a change replaces its own files
+                    paths = (f"{self.pdf_singles_save_path}.{job.index}.part" if "singles" in outputs else None,
+                             f"{self.pdf_grid_save_path}.{job.index}.part" if "grid" in outputs else None)
+                    shard_paths.append(paths)
+                    shard = PdfShard(settings, *paths, layout, *sink_dirs)
+
+                shard.add(job.index, panels[job.index], panel_images)
+                self.on_event(PanelDone(job.index))
+
+                # shards end on a grid page boundary so every page title is complete within its shard
+                page_finished = (job.index + 1) % panels_per_page == 0 or job.index == last_index
+                if page_finished and shard.image_bytes >= settings.shard_max_bytes:
+                    submit_shard()
+                    shard = None
+
+            # a stopped run still writes its partial last shard, and with it the partial last page
+            if shard:
+                submit_shard()
+            while writing:
+                self._shard_written(checkpoint, *writing.popleft())
+        except BaseException:
+            for future, _ in writing:
+                future.cancel()
+            # the recorded shards are kept for a resume
+            self._remove_shards(shard_paths, keep=checkpoint)
+            raise
+
+        # a stopped run's PDFs end where it stopped, the reused shards after it stay recorded
+        stopped = should_stop()
+        if not stopped:
+            add_reused(len(panels))
+        keep = stopped or settings.keep_shards
+
+        # nothing is written when stopped before the first panel
+        if shard_paths:
+            with self.stats.time("merge"):
+                if "singles" in outputs:
+                    self.duplicate_bytes += merge_pdfs([singles_path for singles_path, _ in shard_paths],
+                                                       self.pdf_singles_save_path, keep_inputs=keep)
+                if "grid" in outputs:
+                    self.duplicate_bytes += merge_pdfs([grid_path for _, grid_path in shard_paths],
+                                                       self.pdf_grid_save_path, keep_inputs=keep)
+        if not stopped:
+            self._prune_sinks(*sink_dirs)
+        if keep:
+            self._remove_shards(shard_paths, keep=checkpoint)
+        else:
+            self._remove_shards(shard_paths)
+            checkpoint.remove()
+
+    def _shard_written(self, checkpoint: Checkpoint, future, record: ShardRecord | None):
+        pages, duplicate_bytes, timings = future.result()
+        if record:
+            checkpoint.add(record)
+        self.stats.add_all(timings)
+        self.duplicate_bytes += duplicate_bytes
+        for page_number in pages:
+            self.on_event(PageFlushed(page_number))
+        self.on_event(StageStats(self.stats.as_dict()))
+
+    def _prune_sinks(self, sequence_dir, contact_dir):
+        """ Remove the sink files past the last frame and page, left by an earlier render of more frames """
+        from magick_prototype.shard import contact_sheet_name, sequence_name
+
+        settings = self.settings
+        pages = -(-len(self.panels) // (settings.panel_rows * settings.panel_columns))
+        expected = [
+            (sequence_dir, {sequence_name(settings, index) for index in range(len(self.panels))}),
+            (contact_dir, {contact_sheet_name(settings, page) for page in range(1, pages + 1)}),
+        ]
+        for sink_dir, names in expected:
+            if not sink_dir:
+                continue
+            with os.scandir(sink_dir) as entries:
+                for entry in entries:
+                    # files not named by this render are left alone
+                    if entry.name.startswith(f"{settings.name}_") and entry.name not in names:
+                        os.remove(entry.path)
+
+    def _remove_shards(self, shard_paths, keep: Checkpoint | None = None):
+        for paths in shard_paths:
+            for path in paths:
+                if not path or keep and keep.is_recorded(path):
+                    continue
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def page_layout(self):
+        """
+        The grid pages' layout, its cells take the size of the first panel's.
+        - computed from the first frame's header before anything is rendered, so every shard of a folder
+          lays out the same whichever panel a resumed or refreshed render starts from
+        """
+        grid_style = self.panel_styles().get("grid")
+        if not grid_style or not self.panels:
+            return None
+        # a probing scan has read the header already
+        first_panel = self.panels[0]
+        source_size = first_panel.size or probe_size(os.path.join(self.my_dir, first_panel.file_name))
+        return grid_layout(self.settings, grid_style.panel_size(source_size))
@@ -0,0 +1,247 @@
+import os
+import time
+from dataclasses import dataclass, field
+from io import BytesIO
+from PIL import Image, ImageDraw
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+from magick_prototype.engine import PanelImage, encode_jpeg, load_font
+from magick_prototype.layout import PageLayout
+from magick_prototype.panels import Panel
+from magick_prototype.render import RenderSettings
+from magick_prototype.stats import stage
+
+
+class PanelImageReader(ImageReader):
+    """ ImageReader over encoded JPEG bytes, named by those bytes so drawImage never decodes the panel """
+
+    def __init__(self, data: bytes):
+        super().__init__(BytesIO(data))
+        # drawImage hashes getRGBData() to name the XObject, the JPEG is embedded as-is
+        self._data = data
+        self._dataA = None
+
+
+def sequence_name(settings: RenderSettings, index):
+    return f"{settings.name}_{index + 1:05d}.jpg"
+
+
+def contact_sheet_name(settings: RenderSettings, page_number):
+    return f"{settings.name}_{page_number:04d}.png"
+
+
+def write_replacing(path, data: bytes):
+    # a watched folder's files are replaced in one step, a viewer never reads one half written
+    with open(f"{path}.tmp", "wb") as out_file:
+        out_file.write(data)
+    os.replace(f"{path}.tmp", path)
+
+
+def flatten_panel(panel_img: PanelImage) -> Image.Image:
+    """ The panel decoded with its overlays pasted in, as the PDFs show it """
+    image = Image.open(BytesIO(panel_img.data))
+    image.load()
+    for overlay in panel_img.overlays:
+        image.paste(Image.open(BytesIO(overlay.data)), (overlay.x, overlay.y))
+    return image
+
+
+@dataclass
+class PdfShard:
+    """
+    A run of whole grid pages, written to its own pair of PDFs by a pool worker and merged afterwards.
+    - page numbers and grid slots follow from the panel index, so shards are written independently
+    - grid panels go where the render's PageLayout puts them, a singles page takes the size of its own panel
+    - the panels' encoded images are held until write(), image_bytes is their total
+    - a path or sink folder left None is not written, the sinks' files are final and named by panel or page
+    """
+    settings: RenderSettings
+    singles_path: str | None
+    grid_path: str | None
+    layout: PageLayout | None  # None without a grid style
+    sequence_dir: str | None = None
+    contact_dir: str | None = None
+    panels: list[tuple[int, Panel, dict[str, PanelImage]]] = field(default_factory=list)
+    image_bytes: int = 0
+    # bytes of panel images drawn again, ReportLab names images by their bytes so repeats are embedded once
+    duplicate_bytes: int = 0
+    # (stage, seconds) of the drawImage and showPage calls, filled in by write()
+    timings: list[tuple[str, float]] = field(default_factory=list)
+    # first and last panel of the grid page being written
+    page_panels: list[Panel] = field(default_factory=list)
+
+    def add(self, index, panel: Panel, panel_images: dict[str, PanelImage]):
+        self.panels.append((index, panel, panel_images))
+        self.image_bytes += sum(len(panel_image.data) for panel_image in panel_images.values())
+
+    def write(self):
+        """ Write every output, return the grid page numbers they hold, the duplicate image bytes and the timings """
+        settings = self.settings
+        pdf_file_name = settings.name
+        background_color = tuple(value / 255 for value in settings.background_color)
+        layout = self.layout
+        grid_page_width, grid_page_height = layout.content_size if layout else (0, 0)
+
+        c_singles = canvas.Canvas(self.singles_path) if self.singles_path else None
+        c_grid = canvas.Canvas(self.grid_path, pagesize=layout.page_size) if self.grid_path else None
+        contact_sheet = None
+
+        pages = []
+        drawn = set()
+        write_start = time.perf_counter()
+        panels_per_page = settings.panel_rows * settings.panel_columns
+        last_position = len(self.panels) - 1
+        for position, (index, panel, panel_images) in enumerate(self.panels):
+            single_panel_img = panel_images.get("single")
+            grid_panel_img = panel_images.get("grid")
+
+            if c_singles:
+                c_singles.setPageSize((single_panel_img.width, single_panel_img.height))
+                self.draw_panel(c_singles, single_panel_img, 0, 0, single_panel_img.width, single_panel_img.height,
+                                drawn)
+                self.add_filename(c_singles, pdf_file_name, offset=10, font_size=8)
+                with stage(self.timings, "show_page"):
+                    c_singles.showPage()
+
+            if self.sequence_dir:
+                with stage(self.timings, "sequence"):
+                    # the encoded panel is written as it is unless a frame number goes over it
+                    data = encode_jpeg(flatten_panel(single_panel_img)) if single_panel_img.overlays \
+                        else single_panel_img.data
+                    write_replacing(os.path.join(self.sequence_dir, sequence_name(settings, index)), data)
+
+            page_index, slot = divmod(index, panels_per_page)
+            grid_page = page_index + 1
+
+            if not pages or pages[-1] != grid_page:
+                # Start New Page
+                if c_grid:
+                    c_grid.setFillColorRGB(*background_color)
+                    c_grid.rect(0, 0, *layout.page_size, fill=1)
+                    if layout.scale != 1:
+                        # the page is laid out as without paper and scaled onto it, showPage resets the transform
+                        c_grid.translate(*layout.origin)
+                        c_grid.scale(layout.scale, layout.scale)
+                if self.contact_dir:
+                    contact_sheet = Image.new("RGB", (round(grid_page_width), round(grid_page_height)),
+                                              tuple(settings.background_color))
+                pages.append(grid_page)
+                self.page_panels = [panel, panel]
+            else:
+                # the title only needs the first and last panel, so a page never holds more than two
+                self.page_panels[-1] = panel
+
+            if grid_panel_img:
+                x_offset, y_offset, width, height = layout.place(slot, grid_panel_img.width, grid_panel_img.height)
+                if c_grid:
+                    self.draw_panel(c_grid, grid_panel_img, x_offset, y_offset, width, height, drawn)
+                if contact_sheet:
+                    with stage(self.timings, "contact"):
+                        self.paste_panel(contact_sheet, grid_panel_img, x_offset, y_offset, width, height)
+
+            # a page is finished by its last slot or by the shard's last panel
+            if slot == panels_per_page - 1 or position == last_position:
+                if c_grid:
+                    self.finish_grid_page(c_grid, grid_page, grid_page_width, grid_page_height)
+                    with stage(self.timings, "show_page"):
+                        c_grid.showPage()
+                if contact_sheet:
+                    with stage(self.timings, "contact"):
+                        self.finish_contact_sheet(contact_sheet, grid_page)
+                    contact_sheet = None
+
+        timings = self.timings
+        timings.append(("pdf_write", time.perf_counter() - write_start))
+        with stage(timings, "save"):
+            for c in (c_singles, c_grid):
+                if c:
+                    c.save()
+        return pages, self.duplicate_bytes, timings
+
+    def draw_panel(self, c, panel_img: PanelImage, x, y, width, height, drawn: set):
+        # hand the encoded panels to ReportLab in memory instead of re-reading them from disk
+        with stage(self.timings, "draw_image"):
+            c.drawImage(PanelImageReader(panel_img.data), x=x, y=y, width=width, height=height)
+        if panel_img.data in drawn:
+            self.duplicate_bytes += len(panel_img.data)
+        drawn.add(panel_img.data)
+
+        # overlays are placed from the panel's top left corner, the PDF's origin is bottom left
+        scale = width / panel_img.width
+        for overlay in panel_img.overlays:
+            with stage(self.timings, "draw_image"):
+                c.drawImage(PanelImageReader(overlay.data), x=x + overlay.x * scale,
+                            y=y + (panel_img.height - overlay.y - overlay.height) * scale,
+                            width=overlay.width * scale, height=overlay.height * scale)
+
+    def finish_grid_page(self, c, page_number, page_width, page_height):
+        self.add_page_number(c, page_number, page_width)
+        self.add_filename(c, self.settings.name)
+        self.add_page_title(c, page_number, page_width, page_height)
+
+    def page_title(self):
+        included_panels = self.page_panels
+
+        # get the first and last episode numbers
+        first_episode = included_panels[0].episode
+        last_episode = included_panels[-1].episode
+
+        combined_episode = f"{first_episode}-{last_episode}" if first_episode != last_episode else first_episode
+
+        # get the first and last scene numbers
+        first_scene = included_panels[0].scene
+        last_scene = included_panels[-1].scene
+
+        combined_scene = f"{first_scene}-{last_scene}" if first_scene != last_scene else first_scene
+
+        return f"{combined_episode}_{combined_scene}"
+
+    def add_page_title(self, c, page_number, page_width, page_height):
+        text = self.page_title()
+        font_color = tuple(value / 255 for value in self.settings.font_color)
+        c.setFillColorRGB(*font_color)
+        c.setFont("Helvetica", 48)
+        text_width = c.stringWidth(text, "Helvetica", 48)
+        c.drawString(((page_width - text_width) / 2), (page_height - self.settings.page_title_padding), text)
+
+    def add_page_number(self, c, page_number, page_width):
+        font_color = tuple(value / 255 for value in self.settings.font_color)
+        c.setFillColorRGB(*font_color)
+        c.setFont("Helvetica", 18)
+        c.drawString(page_width - 50, 50, str(page_number))
+
+    def add_filename(self, c, text, offset=50, font_size=18):
+        if not self.settings.include_filename:
+            return
+        font_color = tuple(value / 255 for value in self.settings.font_color)
+        c.setFillColorRGB(*font_color)
+        c.setFont("Helvetica", font_size)
+        c.drawString(offset, offset, text)
+
+    def paste_panel(self, sheet: Image.Image, panel_img: PanelImage, x, y, width, height):
+        # the same place as on the grid page, PIL's origin is the top left corner
+        image = flatten_panel(panel_img)
+        size = (round(width), round(height))
+        if image.size != size:
+            image = image.resize(size, Image.Resampling.LANCZOS)
+        sheet.paste(image, (round(x), sheet.height - round(y) - size[1]))
+
+    def finish_contact_sheet(self, sheet: Image.Image, page_number):
+        # the grid page's texts at its sizes, drawn from their baselines like ReportLab does
+        settings = self.settings
+        draw = ImageDraw.Draw(sheet)
+        font_color = tuple(settings.font_color)
+        draw.text((sheet.width / 2, settings.page_title_padding), self.page_title(), fill=font_color,
+                  font=load_font(None, 48), anchor="ms")
+        draw.text((sheet.width - 50, sheet.height - 50), str(page_number), fill=font_color,
+                  font=load_font(None, 18), anchor="ls")
+        if settings.include_filename:
+            draw.text((50, sheet.height - 50), settings.name, fill=font_color, font=load_font(None, 18), anchor="ls")
+        buffer = BytesIO()
+        sheet.save(buffer, "PNG")
+        write_replacing(os.path.join(self.contact_dir, contact_sheet_name(settings, page_number)), buffer.getvalue())
+
+
+def write_shard(shard: PdfShard):
+    # runs in a pool worker, the shard arrives pickled with its encoded panels
+    return shard.write()
@@ -0,0 +1,56 @@
+import mmap
+import os
+from contextlib import contextmanager
+from io import BytesIO
+from PIL import Image
+
+# sources of this size or larger are mapped by the worker decoding them instead of read ahead and sent to it
+MMAP_MIN_BYTES = 1024 ** 2
+# the page cache hints are POSIX only, elsewhere every source is read ahead whole
+PAGE_CACHE_HINTS = hasattr(os, "posix_fadvise")
+
+
+def read_source(path):
+    """
+    (size, bytes) of a source for the pool, bytes is None when the worker should map it itself.
+    - a large source is only prefetched into the page cache, so it is never copied through the pool's pipe
+    """
+    with open(path, "rb") as source_file:
+        size = os.fstat(source_file.fileno()).st_size
+        if size >= MMAP_MIN_BYTES and PAGE_CACHE_HINTS:
+            os.posix_fadvise(source_file.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+            return size, None
+        return size, source_file.read()
+
+
+@contextmanager
+def open_source(path, data: bytes | None = None):
+    """
+    The source image, opened from data when it was read ahead, otherwise from a read-only memory map of path.
+    - a mapped source is decoded straight out of the page cache, the file is never read into a buffer whole
+    - a large source's pages are dropped from the cache once it is decoded, it is only read once a render
+      and tens of GB of boards would otherwise push everything else out
+    """
+    if data is not None:
+        with Image.open(BytesIO(data)) as image:
+            yield image
+        return
+
+    with open(path, "rb") as source_file:
+        size = os.fstat(source_file.fileno()).st_size
+        # an empty file cannot be mapped, PIL reports it as not an image
+        source = mmap.mmap(source_file.fileno(), 0, access=mmap.ACCESS_READ) if size else source_file
+        try:
+            with Image.open(source) as image:
+                yield image
+        finally:
+            if source is not source_file:
+                source.close()
+            if size >= MMAP_MIN_BYTES and PAGE_CACHE_HINTS:
+                os.posix_fadvise(source_file.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+def probe_size(path):
+    """ (width, height) of an image from its header, the pixels are not decoded """
+    with Image.open(path) as image:
+        return image.size
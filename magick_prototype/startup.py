@@ -0,0 +1,46 @@
+import os
+import subprocess
+import sys
+from dataclasses import dataclass
+
+# seconds the GUI module may spend importing, the rest of a one second cold start is for building the window
+STARTUP_BUDGET_SECONDS = 0.5
+# where prototype.py lives, so the GUI module imports the same way as when it is run
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@dataclass(frozen=True)
+class ImportTime:
+    module: str
+    self_seconds: float
+    total_seconds: float  # including the modules it imported first
+    depth: int  # 0 for modules imported by the measured module itself
+
+
+def import_times(module="prototype"):
+    """ Import module in a fresh interpreter under -X importtime and return every import it made, in order """
+    code = f"import sys; sys.path.insert(0, {ROOT_DIR!r}); import {module}"
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{result.stderr.strip()}")
+
+    times = []
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, total_us, name = line[len("import time:"):].split("|")
+        indent = len(name) - len(name.lstrip())
+        times.append(ImportTime(name.strip(), int(self_us) / 1e6, int(total_us) / 1e6, (indent - 1) // 2))
+    return times
+
+
+def startup_report(times: list[ImportTime], top=15, budget=STARTUP_BUDGET_SECONDS):
+    """ Lines naming the slowest imports and the total against budget, and whether it is within budget """
+    # site and encodings are loaded before -c runs, the measured module is the last import at the top level
+    total = times[-1].total_seconds if times else 0.0
+    lines = [f"{'self ms':>9} {'total ms':>9}  module"]
+    for entry in sorted(times, key=lambda entry: entry.self_seconds, reverse=True)[:top]:
+        lines.append(f"{entry.self_seconds * 1000:9.1f} {entry.total_seconds * 1000:9.1f}  {entry.module}")
+    lines.append(f"imports took {total * 1000:.0f} ms of a {budget * 1000:.0f} ms budget")
+    return lines, total <= budget
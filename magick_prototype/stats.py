@@ -0,0 +1,76 @@
+import csv
+import json
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+
+# upper bounds in milliseconds of the duration histogram buckets, the last bucket holds everything slower
+HISTOGRAM_BOUNDS_MS = (0.1, 0.3, 1, 3, 10, 30, 100, 300, 1000, 3000)
+HISTOGRAM_LABELS = tuple(f"<={bound}ms" for bound in HISTOGRAM_BOUNDS_MS) + (f">{HISTOGRAM_BOUNDS_MS[-1]}ms",)
+
+
+@contextmanager
+def stage(timings: list, name):
+    """ Append (name, seconds) to timings, used where the stats object is in another process """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.append((name, time.perf_counter() - start))
+
+
+class RenderStats:
+    """
+    Seconds, counts and a duration histogram per render stage.
+    - pool stages are timed in the workers and added as their results are consumed, so they sum over workers
+    - only the thread consuming results adds to it
+    """
+
+    def __init__(self):
+        self.seconds: dict[str, float] = defaultdict(float)
+        self.counts: dict[str, int] = defaultdict(int)
+        self.max_seconds: dict[str, float] = defaultdict(float)
+        self.histograms: dict[str, list[int]] = defaultdict(lambda: [0] * len(HISTOGRAM_LABELS))
+
+    def add(self, name, seconds):
+        self.seconds[name] += seconds
+        self.counts[name] += 1
+        self.max_seconds[name] = max(self.max_seconds[name], seconds)
+        self.histograms[name][bisect_left(HISTOGRAM_BOUNDS_MS, seconds * 1000)] += 1
+
+    def add_all(self, timings):
+        for name, seconds in timings:
+            self.add(name, seconds)
+
+    @contextmanager
+    def time(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def as_dict(self):
+        return {
+            name: {
+                "seconds": round(self.seconds[name], 6),
+                "count": self.counts[name],
+                "mean_ms": round(self.seconds[name] * 1000 / self.counts[name], 3),
+                "max_ms": round(self.max_seconds[name] * 1000, 3),
+                "histogram": dict(zip(HISTOGRAM_LABELS, self.histograms[name])),
+            }
+            for name in self.seconds
+        }
+
+    def write_profile(self, json_path, csv_path):
+        stages = self.as_dict()
+        with open(json_path, "w") as json_file:
+            json.dump({"stages": stages}, json_file, indent=2)
+
+        with open(csv_path, "w", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(["stage", "count", "seconds", "mean_ms", "max_ms", *HISTOGRAM_LABELS])
+            for name, values in stages.items():
+                writer.writerow([name, values["count"], values["seconds"], values["mean_ms"], values["max_ms"],
+                                 *values["histogram"].values()])
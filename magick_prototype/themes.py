@@ -0,0 +1,40 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class Theme:
+    name: str
+    font_color: tuple[int, int, int]
+    background_color: tuple[int, int, int]
+
+    @classmethod
+    def from_dict(cls, d):
+        return Theme(
+            name=d['name'],
+            font_color=d['font_color'],
+            background_color=d['background_color']
+        )
+
+
+THEMES = {
+    "Dark": Theme.from_dict({
+        "name": "Dark",
+        "font_color": (122, 138, 163),
+        "background_color": (0, 0, 0)
+    }),
+    "Light": Theme.from_dict({
+        "name": "Light",
+        "font_color": (0, 0, 0),
+        "background_color": (255, 255, 255)
+    }),
+    "Previs": Theme.from_dict({
+        "name": "Previs",
+        "font_color": (254, 215, 0),
+        "background_color": (0, 0, 0)
+    }),
+    "Black & Gray": Theme.from_dict({
+        "name": "Black & Gray",
+        "font_color": (128, 128, 128),
+        "background_color": (0, 0, 0)
+    }),
+}
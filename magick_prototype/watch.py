@@ -0,0 +1,103 @@
+import os
+import time
+from dataclasses import replace
+from magick_prototype.events import FramesChanged
+from magick_prototype.panels import IMAGE_EXTENSIONS, PanelScan
+from magick_prototype.render import PdfRenderer, RenderSettings
+
+# seconds between two listings of a watched folder
+WATCH_INTERVAL = 1.0
+# seconds a folder has to stay unchanged before it is rendered again, frames are saved in bursts
+WATCH_SETTLE = 2.0
+# smaller shards than a one-off render, a change rewrites the whole shard holding it
+WATCH_SHARD_MAX_BYTES = 4 * 1024 ** 2
+
+
+def snapshot(my_dir) -> dict[str, tuple[int, int]]:
+    """ (mtime_ns, size) of every image in my_dir by file name """
+    frames = {}
+    with os.scandir(my_dir) as entries:
+        for entry in entries:
+            if not entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                # removed while listing
+                continue
+            frames[entry.name] = (stat.st_mtime_ns, stat.st_size)
+    return frames
+
+
+class FolderWatch:
+    """
+    Polls a folder for frames added, changed or removed.
+    - polling behaves the same on network shares, where change notifications are often missing
+    - wait() returns once the folder changed and then stayed unchanged for settle seconds,
+      so a frame still being copied is never rendered half written
+    """
+
+    def __init__(self, my_dir, interval=WATCH_INTERVAL, settle=WATCH_SETTLE):
+        self.my_dir = my_dir
+        self.interval = interval
+        self.settle = settle
+        self.frames = snapshot(my_dir)
+
+    def wait(self, should_stop=lambda: False):
+        """ The names added, changed or removed since the last wait(), None when stopped first """
+        frames = self.frames
+        changed_at = None
+        while not should_stop():
+            time.sleep(self.interval)
+            try:
+                current = snapshot(self.my_dir)
+            except OSError:
+                # a share dropping for a moment is not a folder without frames
+                continue
+
+            if current != frames:
+                frames = current
+                changed_at = time.monotonic()
+            elif changed_at is not None and time.monotonic() - changed_at >= self.settle:
+                changed = sorted(name for name in frames.keys() | self.frames.keys()
+                                 if frames.get(name) != self.frames.get(name))
+                self.frames = frames
+                if changed:
+                    return changed
+                # changed back to how it was
+                changed_at = None
+        return None
+
+
+def watch_render(my_dir, settings: RenderSettings, target_dir=None, on_event=None, should_stop=lambda: False,
+                 scan: PanelScan | None = None, new_scan=None, executor=None, interval=WATCH_INTERVAL,
+                 settle=WATCH_SETTLE):
+    """
+    Render my_dir, then render it again every time its frames change, until should_stop.
+    - every render after the first reuses the shards of grid pages whose frames are unchanged, so only the pages
+      holding a changed frame are composited and written before the PDFs are merged again in place, the first
+      one only resumes a checkpoint with settings.resume
+    - scan is the first render's PanelScan, new_scan(my_dir) gives the started scan of every later one
+    - a failed render is reported through on_event and the watch goes on, the next change renders again
+    """
+    on_event = on_event or (lambda event: None)
+    new_scan = new_scan or (lambda path: PanelScan(path).start())
+    settings = replace(settings, keep_shards=True,
+                       shard_max_bytes=min(settings.shard_max_bytes, WATCH_SHARD_MAX_BYTES))
+    watch = FolderWatch(my_dir, interval, settle)
+    scan = scan or new_scan(my_dir)
+
+    while True:
+        renderer = PdfRenderer(my_dir, scan, settings, target_dir=target_dir, on_event=on_event, executor=executor)
+        try:
+            renderer.render(should_stop)
+        except Exception:
+            # the renderer has already posted a RenderError
+            pass
+
+        changed = watch.wait(should_stop)
+        if changed is None:
+            return
+        on_event(FramesChanged(my_dir, changed))
+        scan = new_scan(my_dir)
+        settings = replace(settings, resume=True)
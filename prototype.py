@@ -5,17 +5,32 @@ import ttkbootstrap as ttk
 from tkinter.filedialog import askdirectory
 from ttkbootstrap.constants import *
 from ttkbootstrap.dialogs import Messagebox
-from ttkbootstrap.dialogs.colorchooser import ColorChooserDialog
-from ttkbootstrap.toast import ToastNotification
-from ttkbootstrap.icons import Icon, Emoji
-from reportlab.pdfgen import canvas
-from PIL import Image, ImageDraw, ImageFont
-from pprint import pprint
+import multiprocessing
 import threading
 import queue
-from dataclasses import dataclass
 import traceback
-import subprocess
+from dataclasses import replace
+from magick_prototype.batch import BatchJob, BatchScheduler
+from magick_prototype.engine import default_workers
+from magick_prototype.layout import LAYOUTS, PAPER_SIZES, apply_layout
+from magick_prototype.panels import Panel, PanelScan
+from magick_prototype.events import (FramesChanged, JobProgress, PageFlushed, PanelDone, PanelRendered, PanelsScanned,
+                                     PanelStarted, QueueFinished, RenderError, RenderFinished, ScanFinished, StageStats,
+                                     WatchStopped)
+from magick_prototype.render import PdfRenderer, RenderSettings
+from magick_prototype.themes import THEMES
+from magick_prototype.watch import watch_render
+
+
+# most queued events the main thread handles per check_queue tick
+MAX_EVENTS_PER_TICK = 5000
+# Treeview rows inserted per idle callback while a scanned folder is shown
+TV_FILL_CHUNK = 500
+# longest side of a grid panel, reviewers rarely need more than a thumbnail on the grid PDF
+GRID_SIZES = {"Full": None, "1920 px": 1920, "1280 px": 1280, "960 px": 960, "640 px": 640}
+PDF_OUTPUTS = {"Singles and Grid": ("singles", "grid"), "Grid Only": ("grid",), "Singles Only": ("singles",),
+               "None": ()}
+PAPER_CHOICES = {"Fit Panels": None, **{name: name for name in PAPER_SIZES}}
 
 
 def resource_path(relative_path):
@@ -40,14 +55,20 @@ def open_file(file_path):
     if sys.platform == "win32":
         os.startfile(file_path)
     elif sys.platform == "darwin":
+        import subprocess
         subprocess.call(['open', file_path])
 
 
-def show_error(e):
+def show_toast(title, message):
+    from ttkbootstrap.toast import ToastNotification
+    ToastNotification(title=title, message=message).show_toast()
+
+
+def show_error(e, details=None):
     error_message = f"An unexpected error occurred:\n{str(e)}\n\nPlease restart the application."
     # Log the error details (optional)
     with open("error_log.txt", "a") as log_file:
-        log_file.write(traceback.format_exc())
+        log_file.write(details or traceback.format_exc())
     # Show the error message to the user
     Messagebox.show_error(error_message, "Error")
 
@@ -64,84 +85,6 @@ def rgb_to_hex(rgb):
     return '#{:02x}{:02x}{:02x}'.format(*rgb)
 
 
-class Panel:
-
-    def __init__(self, file_name: str):
-        self.file_name = file_name
-
-        # get the basename of the Image
-        # split the basename by the underscore
-        image_basename = os.path.basename(file_name)
-        image_basename = os.path.splitext(image_basename)[0]
-        self.name_parts = image_basename.split('_')
-
-    def __str__(self):
-        return f"Episode: {self.episode}, Scene: {self.scene}, Frame: {self.frame}:end"
-
-    def __lt__(self, other):
-        return self.frame < other.frame
-
-    @property
-    def frame(self):
-        try:
-            return self.name_parts[0]
-        except IndexError:
-            return 'Undefined'
-
-    @property
-    def episode(self):
-        try:
-            return self.name_parts[1]
-        except IndexError:
-            return 'Undefined'
-
-    @property
-    def scene(self):
-        try:
-            return self.name_parts[2]
-        except IndexError:
-            return 'Undefined'
-
-
-@dataclass
-class Theme:
-    name: str
-    font_color: tuple[int, int, int]
-    background_color: tuple[int, int, int]
-
-    @classmethod
-    def from_dict(cls, d):
-        return Theme(
-            name=d['name'],
-            font_color=d['font_color'],
-            background_color=d['background_color']
-        )
-
-
-THEMES = {
-    "Dark": Theme.from_dict({
-        "name": "Dark",
-        "font_color": (122, 138, 163),
-        "background_color": (0, 0, 0)
-    }),
-    "Light": Theme.from_dict({
-        "name": "Light",
-        "font_color": (0, 0, 0),
-        "background_color": (255, 255, 255)
-    }),
-    "Previs": Theme.from_dict({
-        "name": "Previs",
-        "font_color": (254, 215, 0),
-        "background_color": (0, 0, 0)
-    }),
-    "Black & Gray": Theme.from_dict({
-        "name": "Black & Gray",
-        "font_color": (128, 128, 128),
-        "background_color": (0, 0, 0)
-    }),
-}
-
-
 class App(ttk.Window):
 
     def __init__(self):
@@ -166,16 +109,30 @@ class App(ttk.Window):
                                      state=DISABLED, style=SUCCESS)
         self.pdf_button.grid(row=0, column=1, padx=(0, 10))
 
+        # continues a stopped or failed render from its checkpoint, the same as Create PDFs without one
+        self.resume_button = ttk.Button(self.buttons_frame, text="Resume",
+                                        command=lambda: self.start_create_pdf_thread(resume=True), state=DISABLED,
+                                        style=SUCCESS)
+        self.resume_button.grid(row=0, column=2, padx=(0, 10))
+
         self.stop_pdf_button = ttk.Button(self.buttons_frame, text="Stop", command=self.stop, state=DISABLED,
                                           style=DANGER)
-        self.stop_pdf_button.grid(row=0, column=2, padx=(0, 10))
+        self.stop_pdf_button.grid(row=0, column=3, padx=(0, 10))
 
         self.open_pdf_button = ttk.Button(self.buttons_frame, text="Open PDFs", command=self.open_pdf, state=DISABLED)
-        self.open_pdf_button.grid(row=0, column=3, padx=(0, 10))
+        self.open_pdf_button.grid(row=0, column=4, padx=(0, 10))
+
+        self.add_job_button = ttk.Button(self.buttons_frame, text="Add to Queue", command=self.add_to_queue,
+                                         state=DISABLED, style=INFO)
+        self.add_job_button.grid(row=0, column=5, padx=(0, 10))
+
+        self.run_queue_button = ttk.Button(self.buttons_frame, text="Run Queue", command=self.start_run_queue_thread,
+                                           state=DISABLED, style=INFO)
+        self.run_queue_button.grid(row=0, column=6, padx=(0, 10))
 
         self.reset_button = ttk.Button(self.buttons_frame, text="Reset", command=self.reset, style=WARNING)
-        self.buttons_frame.grid_columnconfigure(4, weight=1)
-        self.reset_button.grid(row=0, column=4, sticky=E)
+        self.buttons_frame.grid_columnconfigure(7, weight=1)
+        self.reset_button.grid(row=0, column=7, sticky=E)
 
         # Settings
         self.settings_frame = ttk.Frame(self)
@@ -200,18 +157,100 @@ class App(ttk.Window):
                                                 variable=self.include_filename_var)
         self.include_filename.grid(row=0, column=4, padx=(0, 20))
 
+        self.export_panels_var = tk.BooleanVar(value=False)
+        self.export_panels = ttk.Checkbutton(self.settings_frame, text="Export Panels", style=LIGHT,
+                                             variable=self.export_panels_var)
+        self.export_panels.grid(row=0, column=5, padx=(0, 20))
+
         self.font_color_btn = ttk.Button(self.settings_frame, text="Set Font Color", style=SECONDARY, command=self.cc)
-        self.font_color_btn.grid(row=0, column=5, padx=(0, 20))
+        self.font_color_btn.grid(row=0, column=6, padx=(0, 20))
 
         self.font_color_preview_canvas = tk.Canvas(self.settings_frame, width=20, height=20)
-        self.font_color_preview_canvas.grid(row=0, column=6, padx=(0, 20))
+        self.font_color_preview_canvas.grid(row=0, column=7, padx=(0, 20))
         self.font_color_preview = self.font_color_preview_canvas.create_rectangle(0, 0, 20, 20, outline="black")
 
+        self.use_cache_var = tk.BooleanVar(value=True)
+        self.use_cache = ttk.Checkbutton(self.settings_frame, text="Use Cache", style=LIGHT,
+                                         variable=self.use_cache_var)
+        self.use_cache.grid(row=0, column=10, padx=(20, 0))
+
+        self.label_workers = ttk.Label(self.settings_frame, text="Workers", style=LIGHT)
+        self.label_workers.grid(row=0, column=8, padx=(0, 0))
+
+        self.workers_var = tk.IntVar(value=default_workers())
+        self.spin_workers = ttk.Spinbox(self.settings_frame, from_=1, to=default_workers(), width=4,
+                                        textvariable=self.workers_var, state=READONLY)
+        self.spin_workers.grid(row=0, column=9, padx=(10, 0))
+
+        self.label_grid_size = ttk.Label(self.settings_frame, text="Grid Size", style=LIGHT)
+        self.label_grid_size.grid(row=0, column=11, padx=(20, 0))
+
+        self.select_grid_size = ttk.Combobox(self.settings_frame, values=list(GRID_SIZES.keys()), width=8,
+                                             state=READONLY)
+        self.select_grid_size.current(0)
+        self.select_grid_size.grid(row=0, column=12, padx=(10, 0))
+
+        self.label_layout = ttk.Label(self.settings_frame, text="Layout", style=LIGHT)
+        self.label_layout.grid(row=1, column=0, padx=(0, 0), pady=(10, 0))
+
+        self.select_layout = ttk.Combobox(self.settings_frame, values=list(LAYOUTS.keys()), state=READONLY)
+        self.select_layout.current(0)
+        self.select_layout.grid(row=1, column=1, padx=(10, 20), pady=(10, 0))
+
+        self.label_paper = ttk.Label(self.settings_frame, text="Paper", style=LIGHT)
+        self.label_paper.grid(row=1, column=2, padx=(0, 0), pady=(10, 0))
+
+        self.select_paper = ttk.Combobox(self.settings_frame, values=list(PAPER_CHOICES.keys()), width=12,
+                                         state=READONLY)
+        self.select_paper.current(0)
+        self.select_paper.grid(row=1, column=3, padx=(10, 20), pady=(10, 0), sticky=W)
+
+        self.write_profile_var = tk.BooleanVar(value=False)
+        self.write_profile = ttk.Checkbutton(self.settings_frame, text="Write Profile", style=LIGHT,
+                                             variable=self.write_profile_var)
+        self.write_profile.grid(row=1, column=4, padx=(0, 20), pady=(10, 0), sticky=W)
+
+        self.show_stats_var = tk.BooleanVar(value=False)
+        self.show_stats = ttk.Checkbutton(self.settings_frame, text="Show Stats", style=LIGHT,
+                                          variable=self.show_stats_var, command=self.toggle_stats)
+        self.show_stats.grid(row=1, column=5, padx=(0, 20), pady=(10, 0), sticky=W)
+
+        self.watch_var = tk.BooleanVar(value=False)
+        self.watch = ttk.Checkbutton(self.settings_frame, text="Watch Folder", style=LIGHT,
+                                     variable=self.watch_var)
+        self.watch.grid(row=1, column=6, padx=(0, 20), pady=(10, 0), sticky=W)
+
+        self.label_pdfs = ttk.Label(self.settings_frame, text="PDFs", style=LIGHT)
+        self.label_pdfs.grid(row=2, column=0, padx=(0, 0), pady=(10, 0))
+
+        self.select_pdfs = ttk.Combobox(self.settings_frame, values=list(PDF_OUTPUTS.keys()), state=READONLY)
+        self.select_pdfs.current(0)
+        self.select_pdfs.grid(row=2, column=1, padx=(10, 20), pady=(10, 0))
+
+        # image sinks written from the same panels as the PDFs, next to them
+        self.sequence_var = tk.BooleanVar(value=False)
+        self.sequence = ttk.Checkbutton(self.settings_frame, text="Image Sequence", style=LIGHT,
+                                        variable=self.sequence_var)
+        self.sequence.grid(row=2, column=2, columnspan=2, padx=(0, 20), pady=(10, 0), sticky=W)
+
+        self.contact_var = tk.BooleanVar(value=False)
+        self.contact = ttk.Checkbutton(self.settings_frame, text="Contact Sheets", style=LIGHT,
+                                       variable=self.contact_var)
+        self.contact.grid(row=2, column=4, padx=(0, 20), pady=(10, 0), sticky=W)
+
         self.my_dir = None
-        self.image_files_map: dict[Panel, str] = {}
+        self.scan: PanelScan | None = None
+        self.watching = False
+        self.panels: list[Panel] = []
+        self.scanned_count = 0
+        self.finished_panels: set[int] = set()
+        self.tv_fill_position = 0
+        self.tv_fill_job = None
         self.pdf_singles_save_path = None
         self.pdf_grid_save_path = None
         self.stop_pdf = False
+        self.panels_done = 0
+        self.pages_flushed = 0
 
         self.dir_label = ttk.Label(self, text="No directory selected", style=f"{INVERSE} {SECONDARY}")
         self.dir_label.pack(fill=X, padx=20, pady=(0, 10))
@@ -235,6 +274,47 @@ class App(ttk.Window):
         self.tv.pack(side=LEFT, fill=BOTH, expand=True)
         self.scrollbar.pack(side=RIGHT, fill=Y)
 
+        # Job Queue
+        self.scheduler = BatchScheduler()
+        self.jobs_tv_items: dict[int, str] = {}
+
+        self.jobs_frame = ttk.Frame(self)
+        self.jobs_frame.pack(fill=X, padx=20, pady=(10, 0))
+
+        self.jobs_tv = ttk.Treeview(self.jobs_frame, show='headings', height=5, style=INFO)
+        self.jobs_tv.configure(columns=(
+            'job queue', 'name', 'state', 'progress'
+        ))
+        self.jobs_tv.column('job queue', width=300, stretch=True)
+
+        for col in self.jobs_tv['columns']:
+            self.jobs_tv.heading(col, text=col.title(), anchor=W)
+
+        self.jobs_scrollbar = ttk.Scrollbar(self.jobs_frame, orient="vertical", command=self.jobs_tv.yview)
+        self.jobs_tv.configure(yscrollcommand=self.jobs_scrollbar.set)
+
+        self.jobs_tv.pack(side=LEFT, fill=BOTH, expand=True)
+        self.jobs_scrollbar.pack(side=RIGHT, fill=Y)
+
+        # Stage Stats
+        self.stats_frame = ttk.Frame(self)
+        # Stats frame will be shown when Show Stats is checked
+
+        self.stats_tv = ttk.Treeview(self.stats_frame, show='headings', height=6, style=SECONDARY)
+        self.stats_tv.configure(columns=(
+            'stage', 'count', 'total s', 'mean ms', 'max ms'
+        ))
+        self.stats_tv.column('stage', width=200, stretch=True)
+
+        for col in self.stats_tv['columns']:
+            self.stats_tv.heading(col, text=col.title(), anchor=W)
+
+        self.stats_scrollbar = ttk.Scrollbar(self.stats_frame, orient="vertical", command=self.stats_tv.yview)
+        self.stats_tv.configure(yscrollcommand=self.stats_scrollbar.set)
+
+        self.stats_tv.pack(side=LEFT, fill=BOTH, expand=True)
+        self.stats_scrollbar.pack(side=RIGHT, fill=Y)
+
         # Progress Bar
         self.progress_frame = ttk.Frame(self)
         # Progress frame will be shown when the folder is selected
@@ -259,17 +339,9 @@ class App(ttk.Window):
         self.background_color = THEMES[default_theme].background_color
         self.update_color_preview()
 
-        # GRID PDF SETTINGS
-        self.page_padding = 50
-        self.page_title_padding = 100
-        self.page_footer_padding = 70
-        self.panel_padding = 50
-        self.panel_rows = 3
-        self.panel_columns = 3
-
-        self.panel_page_map: dict[int, list[Panel]] = {}
-
     def cc(self):
+        # dialogs and toasts are imported when first shown to keep them out of startup
+        from ttkbootstrap.dialogs.colorchooser import ColorChooserDialog
         color_chooser = ColorChooserDialog(self, initialcolor=rgb_to_hex(self.font_color))
         color_chooser.show()
         self.font_color = color_chooser.result.rgb
@@ -294,17 +366,181 @@ class App(ttk.Window):
         self.update_color_preview()
 
     def check_queue(self):
+        # drain the events posted by the render threads, a bounded batch per tick keeps the window responsive
+        events = []
         try:
-            message = self.message_queue.get_nowait()
-            if message == "PDFs created":
-                ToastNotification(
-                    title="Accio PDFs!",
-                    message="Your files have been summoned",
-                ).show_toast()
+            while len(events) < MAX_EVENTS_PER_TICK:
+                events.append(self.message_queue.get_nowait())
         except queue.Empty:
             pass
+        if events:
+            self.handle_events(events)
         self.after(100, self.check_queue)
 
+    def handle_events(self, events):
+        # only the latest state of each panel and job in the batch reaches the widgets
+        panel_states: dict[int, str] = {}
+        job_progress: dict[int, JobProgress] = {}
+        stage_stats = None
+        final_events = []
+
+        for event in events:
+            if isinstance(event, PanelStarted):
+                panel_states[event.index] = 'Processing'
+            elif isinstance(event, PanelRendered):
+                # the pool thread may report a panel after the writer already finished it
+                if panel_states.get(event.index) != 'Done':
+                    panel_states[event.index] = 'Rendered'
+            elif isinstance(event, PanelDone):
+                panel_states[event.index] = 'Done'
+                self.panels_done += 1
+            elif isinstance(event, PageFlushed):
+                self.pages_flushed = event.page
+            elif isinstance(event, JobProgress):
+                job_progress[event.job_id] = event
+            elif isinstance(event, StageStats):
+                stage_stats = event
+            elif isinstance(event, PanelsScanned):
+                self.on_panels_scanned(event)
+            elif isinstance(event, ScanFinished):
+                # handled right away, the panel events that follow index into the sorted panels
+                self.on_scan_finished(event)
+            elif isinstance(event, FramesChanged):
+                # handled right away, the events that follow belong to the next render
+                self.on_frames_changed(event)
+            else:
+                final_events.append(event)
+
+        if panel_states:
+            self.update_progress(panel_states)
+        for event in job_progress.values():
+            self.update_job_item(event)
+        if stage_stats:
+            self.update_stats(stage_stats)
+
+        for event in final_events:
+            if isinstance(event, RenderFinished):
+                self.on_render_finished(event)
+            elif isinstance(event, QueueFinished):
+                self.on_queue_finished(event)
+            elif isinstance(event, WatchStopped):
+                self.on_watch_stopped(event)
+            elif isinstance(event, RenderError):
+                self.on_render_error(event)
+
+    def on_panels_scanned(self, event: PanelsScanned):
+        if event.my_dir != self.my_dir or not (self.scan or self.watching):
+            return
+        self.scanned_count += event.found
+        # rendering can start on the first frames, the rest of the folder is composited as it is found
+        if self.scanned_count == event.found and not self.watching:
+            self.pdf_button.config(state=NORMAL)
+            self.resume_button.config(state=NORMAL)
+        if not self.panels_done:
+            self.progress_label.config(text=f"Scanning... {self.scanned_count} Images Found")
+
+    def on_scan_finished(self, event: ScanFinished):
+        if event.my_dir != self.my_dir or not (self.scan or self.watching):
+            return
+        if event.error:
+            show_error(event.error, event.error)
+
+        self.panels = event.panels
+        if not self.panels:
+            self.pdf_button.config(state=DISABLED)
+            self.resume_button.config(state=DISABLED)
+            return
+
+        if not self.watching:
+            self.add_job_button.config(state=NORMAL)
+        if not self.panels_done:
+            self.progress_label.config(text=f"0 / {len(self.panels)} Images Processed")
+        self.fill_tv()
+
+    def fill_tv(self):
+        # rows go in a chunk at a time so the window keeps handling events on huge folders
+        start = self.tv_fill_position
+        for index, panel in enumerate(self.panels[start:start + TV_FILL_CHUNK], start):
+            if index in self.finished_panels:
+                continue
+            self.tv.insert('', 'end', iid=f"panel{index}", values=(
+                panel.file_name, panel.episode, panel.scene, panel.frame,
+                'Pending' if panel.readable else 'Unreadable'
+            ))
+
+        self.tv_fill_position = start + TV_FILL_CHUNK
+        if self.tv_fill_position < len(self.panels):
+            self.tv_fill_job = self.after(1, self.fill_tv)
+        else:
+            self.tv_fill_job = None
+
+    def on_render_finished(self, event: RenderFinished):
+        # Update the app state
+        self.open_pdf_button.config(state=NORMAL)
+        if self.watching and not event.stopped:
+            # the watch keeps running until Stop, the PDFs were updated in place
+            self.progress_label.config(text=f"{self.panels_done} / {len(self.panels)} Images Processed, "
+                                            f"watching for changes...")
+            return
+        self.finish_render(resumable=event.stopped and not self.watching)
+
+        message = "Your files have been summoned"
+        if event.stopped:
+            message += "\nResume to continue"
+        if event.held_frames or event.duplicate_bytes:
+            message += (f"\n{event.held_frames} held frames reused, "
+                        f"{event.duplicate_bytes / 1024 ** 2:.1f} MB of duplicate images shared")
+
+        show_toast("Accio PDFs!", message)
+
+    def on_render_error(self, event: RenderError):
+        # a watch keeps going after a failed render, anything else is over and gets its controls back
+        if not self.watching:
+            self.finish_render(resumable=bool(self.scan and self.panels))
+            if any(job.state == 'Queued' for job in self.scheduler.jobs):
+                self.run_queue_button.config(state=NORMAL)
+        show_error(event.message, event.details)
+
+    def finish_render(self, resumable=False):
+        # a stopped or failed render keeps its scan, name and colour, so Resume finds its checkpoint
+        # and continues with the settings it was written with
+        if not resumable:
+            self.scan = None
+        self.stop_pdf_button.config(state=DISABLED)
+        self.pdf_button.config(state=NORMAL if resumable else DISABLED)
+        self.resume_button.config(state=NORMAL if resumable else DISABLED)
+        self.reset_button.config(state=NORMAL)
+        self.select_dir_button.config(state=NORMAL)
+
+    def on_frames_changed(self, event: FramesChanged):
+        if event.my_dir != self.my_dir:
+            return
+        # the folder is scanned again, its rows come back with the ScanFinished that follows
+        self.panels = []
+        self.scanned_count = 0
+        self.finished_panels = set()
+        self.panels_done = 0
+        self.pages_flushed = 0
+        if self.tv_fill_job:
+            self.after_cancel(self.tv_fill_job)
+            self.tv_fill_job = None
+        self.tv_fill_position = 0
+        self.tv.delete(*self.tv.get_children())
+        self.progress_label.config(text=f"{len(event.changed)} Frames Changed, Scanning...")
+
+    def on_watch_stopped(self, event: WatchStopped):
+        self.watching = False
+        self.finish_render()
+
+    def on_queue_finished(self, event: QueueFinished):
+        if event.pending:
+            self.run_queue_button.config(state=NORMAL)
+        self.stop_pdf_button.config(state=DISABLED)
+        self.reset_button.config(state=NORMAL)
+        self.select_dir_button.config(state=NORMAL)
+
+        show_toast("Accio PDFs!", "Your queue has been summoned")
+
     def get_image_size(self, image_path):
         full_path = os.path.join(self.my_dir, image_path)  # Get the full path of the item
         try:
@@ -322,49 +558,54 @@ class App(ttk.Window):
             self.reset()
             self.dir_label.config(text=self.my_dir)
 
-            # Get a list of all the files in the directory
-            list_dir = os.listdir(self.my_dir)
-
-            panels: list[Panel] = []
-
-            # Add the files to the text box
-            for item in list_dir:
-                # check if the item is an image file
-                if not item.lower().endswith(('.png', '.jpg', '.jpeg')):
-                    continue
-                panels.append(Panel(item))
-
-            panels.sort()
-
-            for panel in panels:
-                self.image_files_map[panel] = self.tv.insert('', 'end', values=(
-                    panel.file_name, panel.episode, panel.scene, panel.frame, 'Pending'
-                ))
-
-            self.pdf_button.config(state=NORMAL)
+            self.scan = self.start_scan(self.my_dir)
 
             if self.entry_name.get() == "":
                 self.entry_name.insert(0, os.path.basename(self.my_dir))
 
-            self.progress_label.config(text=f"0 / {len(self.image_files_map)} Images Processed")
+            self.progress_label.config(text="Scanning...")
             self.show_progress()
 
         except Exception as e:
             show_error(e)
 
+    def start_scan(self, my_dir):
+        # list the folder on a background thread, the rows are added once it is sorted
+        # headers are probed as the folder is listed, frames that are not images show before a render
+        return PanelScan(
+            my_dir,
+            probe=True,
+            on_batch=lambda batch: self.message_queue.put(PanelsScanned(my_dir, len(batch))),
+            on_finished=lambda panels, error: self.message_queue.put(
+                ScanFinished(my_dir, panels, str(error) if error else None)
+            ),
+        ).start()
+
     def reset(self):
-        self.image_files_map = {}
+        self.scan = None
+        self.panels = []
+        self.scanned_count = 0
+        self.finished_panels = set()
+        self.panels_done = 0
+        self.pages_flushed = 0
+        if self.tv_fill_job:
+            self.after_cancel(self.tv_fill_job)
+            self.tv_fill_job = None
+        self.tv_fill_position = 0
         self.dir_label.config(text='No directory selected')
         self.pdf_singles_save_path = None
         self.pdf_grid_save_path = None
         self.pdf_button.config(state=DISABLED)
+        self.resume_button.config(state=DISABLED)
         self.stop_pdf_button.config(state=DISABLED)
         self.open_pdf_button.config(state=DISABLED)
+        self.add_job_button.config(state=DISABLED)
+        self.select_dir_button.config(state=NORMAL)
         self.reset_theme()
         self.reset_progress()
         self.entry_name.delete(0, 'end')
-        for i in self.tv.get_children():
-            self.tv.delete(i)
+        self.tv.delete(*self.tv.get_children())
+        self.stats_tv.delete(*self.stats_tv.get_children())
 
     def reset_theme(self):
         self.font_color = THEMES[self.select_theme.get()].font_color
@@ -378,274 +619,164 @@ class App(ttk.Window):
     def show_progress(self):
         self.progress_frame.pack(fill=X, padx=20, pady=10)
 
+    def toggle_stats(self):
+        if self.show_stats_var.get():
+            self.stats_frame.pack(fill=X, padx=20, pady=(10, 0), after=self.jobs_frame)
+        else:
+            self.stats_frame.pack_forget()
+
+    def update_stats(self, event: StageStats):
+        self.stats_tv.delete(*self.stats_tv.get_children())
+        # slowest stage first
+        for name, values in sorted(event.stages.items(), key=lambda item: -item[1]["seconds"]):
+            self.stats_tv.insert('', 'end', values=(
+                name, values["count"], f"{values['seconds']:.2f}", f"{values['mean_ms']:.1f}", f"{values['max_ms']:.1f}"
+            ))
+
     def update_tv_item_state(self, tv_item, state):
+        # rendered panels may already be written and removed from the Treeview
+        if not self.tv.exists(tv_item):
+            return
         values = self.tv.item(tv_item, 'values')
         self.tv.item(tv_item, values=(values[0], values[1], values[2], values[3], state))
-        self.update_idletasks()
+
+    def update_progress(self, states: dict[int, str]):
+        finished_items = []
+        for index, state in states.items():
+            tv_item = f"panel{index}"
+            if state == 'Done':
+                self.finished_panels.add(index)
+                finished_items.append(tv_item)
+            else:
+                self.update_tv_item_state(tv_item, state)
+
+        # Remove the finished items from the Treeview in one go
+        finished_items = [tv_item for tv_item in finished_items if self.tv.exists(tv_item)]
+        if finished_items:
+            self.tv.delete(*finished_items)
+
+        total = len(self.panels)
+        if not total:
+            return
+        self.progress_bar['value'] = (100 / total) * self.panels_done
+        self.progress_label.config(
+            text=f"{self.panels_done} / {total} Images Processed, {self.pages_flushed} Grid Pages"
+        )
 
     def stop(self):
         self.stop_pdf = True
         self.stop_pdf_button.config(state=DISABLED)
         self.reset_button.config(state=NORMAL)
 
-    def start_create_pdf_thread(self):
+    def start_create_pdf_thread(self, resume=False):
+        if not self.scan or not self.has_outputs():
+            return
+
+        self.pdf_button.config(state=DISABLED)
+        self.resume_button.config(state=DISABLED)
+        self.add_job_button.config(state=DISABLED)
         self.select_dir_button.config(state=DISABLED)
         self.stop_pdf_button.config(state=NORMAL)
         self.reset_button.config(state=DISABLED)
         self.stop_pdf = False
 
-        pdf_thread = threading.Thread(target=self.create_pdf)
+        # everything Tk is read here, the render thread only posts events to message_queue
+        self.panels_done = 0
+        self.pages_flushed = 0
+        settings = replace(self.get_render_settings(), resume=resume)
+        renderer = PdfRenderer(self.my_dir, self.scan, settings, on_event=self.message_queue.put)
+        # Open PDFs only opens the ones this render writes
+        self.pdf_singles_save_path = renderer.pdf_singles_save_path if "singles" in settings.outputs else None
+        self.pdf_grid_save_path = renderer.pdf_grid_save_path if "grid" in settings.outputs else None
+
+        if self.watch_var.get():
+            self.watching = True
+            pdf_thread = threading.Thread(target=self.watch_pdf, args=(self.my_dir, self.scan, settings))
+        else:
+            pdf_thread = threading.Thread(target=self.create_pdf, args=(renderer,))
         pdf_thread.start()
 
-    def create_pdf(self):
-        try:
-            if not self.image_files_map:
-                return
-
-            pdf_file_name = self.entry_name.get()
-            target_dir = os.path.dirname(self.my_dir)
-            self.pdf_singles_save_path = f"{target_dir}/{pdf_file_name}.pdf"
-            self.pdf_grid_save_path = f"{target_dir}/{pdf_file_name}_grid.pdf"
-
-            background_color = tuple(value / 255 for value in self.background_color)
-
-            c_singles = None
-            c_grid = None
-            grid_row = 0
-            grid_column = 0
-            grid_page = 1
-            counter = 0
-            for panel, tv_item in self.image_files_map.items():
-
-                if self.stop_pdf:
-                    break
-
-                # Update the Treeview item to indicate processing
-                self.update_tv_item_state(tv_item, 'Processing')
-
-                single_panel_img_path, single_panel_img = self.create_panel_image(panel, style="single")
-                grid_panel_img_path, grid_panel_img = self.create_panel_image(panel, style="grid")
-
-                self.update_tv_item_state(tv_item, 'Adding to PDFs')
-
-                # adjust the canvas size
-                if not c_singles:
-                    c_singles = canvas.Canvas(self.pdf_singles_save_path,
-                                              pagesize=[single_panel_img.width, single_panel_img.height])
-
-                c_singles.drawImage(f"{single_panel_img_path}", 0, 0)
-                self.add_filename(c_singles, pdf_file_name, offset=10, font_size=8)
-                c_singles.showPage()
-
-                grid_page_width = (
-                        (grid_panel_img.width * self.panel_columns) +
-                        (self.panel_padding * (self.panel_columns - 1)) +
-                        (self.page_padding * 2)
-                )
-                grid_page_height = (
-                        (grid_panel_img.height * self.panel_rows) +
-                        (self.panel_padding * (self.panel_rows - 1)) +
-                        (self.page_padding * 2) +
-                        self.page_title_padding +
-                        self.page_footer_padding
-                )
-                if not c_grid:
-                    c_grid = canvas.Canvas(self.pdf_grid_save_path, pagesize=[grid_page_width, grid_page_height])
-                    c_grid.setFillColorRGB(*background_color)
-                    c_grid.rect(0, 0, grid_page_width, grid_page_height, fill=1)
-
-                if grid_row < self.panel_rows:
-                    x_offset, y_offset = self.calculate_xy_offsets(grid_panel_img, grid_row, grid_column,
-                                                                   grid_page_height)
-                    c_grid.drawImage(f"{grid_panel_img_path}", x=x_offset, y=y_offset)
-                    self.add_panel_to_page(panel, grid_page)
-
-                    if grid_column < (self.panel_columns - 1):
-                        grid_column += 1
-                    else:
-                        grid_row += 1
-                        grid_column = 0
-                else:
-                    self.add_page_number(c_grid, grid_page, grid_page_width)
-                    self.add_filename(c_grid, pdf_file_name)
-                    self.add_page_title(c_grid, grid_page, grid_page_width, grid_page_height)
-
-                    # Start New Page
-                    c_grid.showPage()
-                    c_grid.setFillColorRGB(*background_color)
-                    c_grid.rect(0, 0, grid_page_width, grid_page_height, fill=1)
-                    grid_row = 0
-                    grid_column = 0
-                    grid_page += 1
-
-                    # First Image of the new Page
-                    x_offset, y_offset = self.calculate_xy_offsets(grid_panel_img, grid_row, grid_column,
-                                                                   grid_page_height)
-                    c_grid.drawImage(f"{grid_panel_img_path}", x=x_offset, y=y_offset)
-                    self.add_panel_to_page(panel, grid_page)
-
-                    grid_column += 1
-
-                # if is last item, add the page number and title
-                if panel == list(self.image_files_map.keys())[-1]:
-                    self.add_page_number(c_grid, grid_page, grid_page_width)
-                    self.add_filename(c_grid, pdf_file_name)
-                    self.add_page_title(c_grid, grid_page, grid_page_width, grid_page_height)
-
-                # Remove the item from the Treeview and the image_files_map
-                self.tv.delete(tv_item)
-
-                # Update progress
-                counter += 1
-                self.progress_bar['value'] = (100 / len(self.image_files_map)) * counter
-                self.progress_label.config(text=f"{counter} / {len(self.image_files_map)} Images Processed")
-
-                # Make sure we see the GUI updates
-                self.update_idletasks()
-
-            c_singles.save()
-            c_grid.save()
-
-            # Update the app state
-            self.image_files_map = {}
-            self.panel_page_map = {}
-            self.open_pdf_button.config(state=NORMAL)
-            self.stop_pdf_button.config(state=DISABLED)
-            self.pdf_button.config(state=DISABLED)
-            self.reset_button.config(state=NORMAL)
-            self.select_dir_button.config(state=NORMAL)
+    def get_render_settings(self):
+        settings = RenderSettings(
+            name=self.entry_name.get(),
+            font_color=tuple(self.font_color),
+            background_color=tuple(self.background_color),
+            include_filename=self.include_filename_var.get(),
+            export_panels=self.export_panels_var.get(),
+            workers=self.workers_var.get(),
+            use_cache=self.use_cache_var.get(),
+            grid_max_size=GRID_SIZES[self.select_grid_size.get()],
+            write_profile=self.write_profile_var.get(),
+            paper=PAPER_CHOICES[self.select_paper.get()],
+            outputs=self.get_outputs(),
+        )
+        return apply_layout(settings, self.select_layout.get())
 
-            # Post a message to the queue
-            self.message_queue.put("PDFs created")
+    def has_outputs(self):
+        # "None" PDFs without a sink would leave the render nothing to write
+        if self.get_outputs():
+            return True
+        Messagebox.show_warning("Choose PDFs, Image Sequence or Contact Sheets to write.", "Nothing to Write")
+        return False
 
-        except Exception as e:
-            show_error(e)
+    def get_outputs(self):
+        sinks = (("sequence",) if self.sequence_var.get() else ()) + (("contact",) if self.contact_var.get() else ())
+        return PDF_OUTPUTS[self.select_pdfs.get()] + sinks
 
-    def add_panel_to_page(self, panel: Panel, page: int):
-        if page not in self.panel_page_map:
-            self.panel_page_map[page] = []
-        self.panel_page_map[page].append(panel)
+    def add_to_queue(self):
+        if not self.panels or not self.has_outputs():
+            return
 
-    def add_page_title(self, c, page_number, page_width, page_height):
-        included_panels = self.panel_page_map[page_number]
+        # snapshot the folder and its settings, then free the main view for the next folder
+        job = self.scheduler.add(BatchJob(self.my_dir, self.get_render_settings(), panels=self.panels))
+        self.jobs_tv_items[job.job_id] = self.jobs_tv.insert('', 'end', values=(
+            job.my_dir, job.settings.name, job.state, f"0 / {job.total}"
+        ))
+        self.reset()
+        self.run_queue_button.config(state=NORMAL)
 
-        # get the first and last episode numbers
-        first_episode = included_panels[0].episode
-        last_episode = included_panels[-1].episode
+    def update_job_item(self, event: JobProgress):
+        values = self.jobs_tv.item(self.jobs_tv_items[event.job_id], 'values')
+        self.jobs_tv.item(self.jobs_tv_items[event.job_id], values=(
+            values[0], values[1], event.state, f"{event.done} / {event.total}"
+        ))
 
-        combined_episode = f"{first_episode}-{last_episode}" if first_episode != last_episode else first_episode
+    def start_run_queue_thread(self):
+        self.select_dir_button.config(state=DISABLED)
+        self.pdf_button.config(state=DISABLED)
+        self.resume_button.config(state=DISABLED)
+        self.run_queue_button.config(state=DISABLED)
+        self.stop_pdf_button.config(state=NORMAL)
+        self.reset_button.config(state=DISABLED)
+        self.stop_pdf = False
 
-        # get the first and last scene numbers
-        first_scene = included_panels[0].scene
-        last_scene = included_panels[-1].scene
+        self.scheduler.cpu_budget = self.workers_var.get()
+        self.scheduler.on_event = self.message_queue.put
 
-        combined_scene = f"{first_scene}-{last_scene}" if first_scene != last_scene else first_scene
+        queue_thread = threading.Thread(target=self.run_queue)
+        queue_thread.start()
 
-        text = f"{combined_episode}_{combined_scene}"
-        font_color = tuple(value / 255 for value in self.font_color)
-        c.setFillColorRGB(*font_color)
-        c.setFont("Helvetica", 48)
-        text_width = c.stringWidth(text, "Helvetica", 48)
-        c.drawString(((page_width - text_width) / 2), (page_height - self.page_title_padding), text)
+    def run_queue(self):
+        try:
+            jobs = self.scheduler.run(should_stop=lambda: self.stop_pdf)
+            self.message_queue.put(QueueFinished(pending=sum(job.state == 'Queued' for job in jobs)))
+        except Exception as e:
+            self.message_queue.put(RenderError(str(e), traceback.format_exc()))
 
-    def add_page_number(self, c, page_number, page_width):
-        font_color = tuple(value / 255 for value in self.font_color)
-        c.setFillColorRGB(*font_color)
-        c.setFont("Helvetica", 18)
-        c.drawString(page_width - 50, 50, str(page_number))
+    def create_pdf(self, renderer: PdfRenderer):
+        try:
+            renderer.render(should_stop=lambda: self.stop_pdf)
+        except Exception:
+            # the renderer has already posted a RenderError for the main thread
+            pass
 
-    def add_filename(self, c, text, offset=50, font_size=18):
-        if not self.include_filename_var.get():
-            return
-        font_color = tuple(value / 255 for value in self.font_color)
-        c.setFillColorRGB(*font_color)
-        c.setFont("Helvetica", font_size)
-        c.drawString(offset, offset, text)
-
-    def calculate_xy_offsets(self, panel_img, row, col, page_height):
-        """
-        - row and col start at 0
-        - 0 x-offset and 0 y-offset is the bottom left corner of the canvas
-        - the position of a placed image is oriented from its bottom left corner
-        """
-        x_offset = (panel_img.width * col) + (self.panel_padding * col) + self.page_padding
-        y_offset = page_height - self.page_padding - self.page_title_padding - panel_img.height - (
-                (panel_img.height + self.panel_padding) * row)
-        return x_offset, y_offset
-
-    def create_panel_image(self, panel: Panel, style="single"):
-
-        add_header = True
-        add_footer = True
-
-        if style == "grid":
-            add_header = False
-
-        # todo: allow user to adjust these settings at runtime
-        header_padding = 30 if add_header else 0
-        footer_padding = 45 if style == "grid" else 30 if add_footer else 0
-        header_font_size = 24 if style == "grid" else 16
-        footer_font_size = 35 if style == "grid" else 16
-        header_text_padding = 5 if add_header else 0
-        # footer_text_padding = 15 if add_footer else 0
-        footer_text_padding = 10 if add_footer else 0
-
-        font_color = self.font_color
-        background_color = self.background_color
-
-        ########################################
-
-        original_image = Image.open(f"{self.my_dir}/{panel.file_name}")
-        original_width, original_height = original_image.size
-
-        header_text = f"{panel.episode}_{panel.scene}"
-        footer_text = f"{panel.frame}"
-
-        # create header and footer text
-        # font = ImageFont.truetype(font="arial.ttf", size=24)
-        header_font = ImageFont.load_default(size=header_font_size)  # Use the built-in default font
-        footer_font = ImageFont.load_default(size=footer_font_size)  # Use the built-in default font
-        ht_left, ht_top, ht_right, ht_bottom = header_font.getbbox(header_text)
-        bt_left, bt_top, bt_right, bt_bottom = footer_font.getbbox(footer_text)
-
-        # Add space for text and some padding
-        total_height = original_height + header_padding + footer_padding
-
-        # Create a new blank image
-        new_image = Image.new("RGB", (original_width, int(total_height)), color=background_color)
-
-        # Paste the original image below the header
-        new_image.paste(original_image, (0, header_padding))
-
-        # Draw the image
-        draw = ImageDraw.Draw(new_image)
-
-        # Add text above
-        if add_header:
-            header_text_x = int((original_width - ht_right) / 2)  # Center the text
-            text_image = Image.new("RGB", (ht_right, ht_bottom), color=background_color)
-            draw = ImageDraw.Draw(text_image)
-            draw.text((0, 0), header_text, fill=font_color, font=header_font)
-            new_image.paste(text_image, (header_text_x, header_text_padding))
-
-        # Add text below
-        if add_footer:
-            footer_text_x = int((original_width - bt_right) / 2)  # Center the text
-            text_image = Image.new("RGB", (bt_right, bt_bottom), color=background_color)
-            draw = ImageDraw.Draw(text_image)
-            draw.text((0, 0), footer_text, fill=font_color, font=footer_font)
-            footer_text_y = total_height - bt_bottom - footer_text_padding
-            new_image.paste(text_image, (footer_text_x, footer_text_y))
-
-        # create panel dir if not exists
-        panel_dir = f"{os.path.dirname(self.my_dir)}/panels/{style}"
-        if not os.path.exists(panel_dir):
-            os.makedirs(panel_dir, exist_ok=True)
-
-        # Save or display the new image
-        new_image_path = f"{panel_dir}/{panel.frame}_{panel.episode}_{panel.scene}.jpg"
-        new_image.save(new_image_path, "JPEG")
-        return new_image_path, new_image
+    def watch_pdf(self, my_dir, scan: PanelScan, settings: RenderSettings):
+        try:
+            watch_render(my_dir, settings, on_event=self.message_queue.put, should_stop=lambda: self.stop_pdf,
+                         scan=scan, new_scan=self.start_scan)
+        except Exception as e:
+            self.message_queue.put(RenderError(str(e), traceback.format_exc()))
+        self.message_queue.put(WatchStopped(my_dir))
 
     def open_pdf(self):
         if self.pdf_singles_save_path:
@@ -655,5 +786,7 @@ class App(ttk.Window):
 
 
 if __name__ == "__main__":
+    # required for the render pool in frozen (PyInstaller) builds
+    multiprocessing.freeze_support()
     app = App()
     app.mainloop()
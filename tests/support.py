@@ -0,0 +1,50 @@
+import pypdf
+from PIL import Image
+from magick_prototype.events import PageFlushed, PanelStarted
+from magick_prototype.panels import list_panels
+from magick_prototype.render import PdfRenderer, RenderSettings
+
+
+def write_frame(frames_dir, frame, size, shade=None):
+    """ A frame_episode_scene JPEG, a different gray for every frame unless shade so no two are held frames """
+    shade = frame * 7 % 256 if shade is None else shade
+    Image.new("RGB", size, (shade,) * 3).save(frames_dir / f"{frame}_101_000.jpg")
+
+
+def write_frames(frames_dir, sizes):
+    """ A frame of every size in sizes, in order from frame 1 """
+    frames_dir.mkdir()
+    for frame, size in enumerate(sizes, start=1):
+        write_frame(frames_dir, frame, size)
+    return str(frames_dir)
+
+
+def render(frames_dir, out_dir, stop_after_page=None, **settings):
+    """ Render frames_dir into out_dir a shard a page, and return the indices of the panels it rendered """
+    out_dir.mkdir(exist_ok=True)
+    flushed = []
+    started = []
+
+    def on_event(event):
+        if isinstance(event, PageFlushed):
+            flushed.append(event.page)
+        elif isinstance(event, PanelStarted):
+            started.append(event.index)
+
+    settings = RenderSettings(**{"name": "s", "use_cache": False, "shard_max_bytes": 1, **settings})
+    renderer = PdfRenderer(str(frames_dir), list_panels(str(frames_dir)), settings, target_dir=str(out_dir),
+                           on_event=on_event)
+    renderer.render(should_stop=lambda: stop_after_page is not None and stop_after_page in flushed)
+    return sorted(started)
+
+
+def pages(out_dir):
+    """ The size, text and images of every page of both PDFs """
+    return [
+        (tuple(page.mediabox), page.extract_text(), [image.data for image in page.images])
+        for name in ("s.pdf", "s_grid.pdf") for page in pypdf.PdfReader(out_dir / name).pages
+    ]
+
+
+def page_sizes(path):
+    return [(float(page.mediabox.width), float(page.mediabox.height)) for page in pypdf.PdfReader(path).pages]
@@ -0,0 +1,94 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from magick_prototype.batch import BatchJob, BatchScheduler
+from magick_prototype.render import RenderSettings
+from tests.support import write_frames
+
+
+class TimedScheduler(BatchScheduler):
+    """ Runs every job as a short wait instead of a render, and records how many ran at once """
+
+    def __init__(self, executor, job_seconds=0.05, barrier=None, **kwargs):
+        super().__init__(executor=executor, **kwargs)
+        self.job_seconds = job_seconds
+        self.barrier = barrier
+        self.in_flight = 0
+        self.most_in_flight = 0
+        self.lock = threading.Lock()
+
+    def _run_job(self, job, executor, should_stop):
+        with self.lock:
+            self.in_flight += 1
+            self.most_in_flight = max(self.most_in_flight, self.in_flight)
+        if self.barrier:
+            self.barrier.wait()
+        time.sleep(self.job_seconds)
+        with self.lock:
+            self.in_flight -= 1
+        self._set_state(job, 'Done')
+
+
+@pytest.fixture
+def executor():
+    """ A small in-process pool in place of the render processes """
+    with ThreadPoolExecutor(2) as executor:
+        yield executor
+
+
+@pytest.fixture
+def estimate(monkeypatch):
+    """ Sets the memory estimate of every job """
+    def set_estimate(bytes_):
+        monkeypatch.setattr(BatchJob, "estimate_memory", lambda self, workers: bytes_)
+    return set_estimate
+
+
+def add_jobs(scheduler, count):
+    return [scheduler.add(BatchJob(f"folder{number}", RenderSettings(name=f"job{number}"), panels=[]))
+            for number in range(count)]
+
+
+def test_jobs_that_fit_the_memory_budget_run_together(executor, estimate):
+    estimate(100)
+    # both jobs have to be at the barrier at once, or it times out and fails them
+    scheduler = TimedScheduler(executor, barrier=threading.Barrier(2, timeout=5), memory_budget=200,
+                               max_parallel_jobs=2)
+    jobs = add_jobs(scheduler, 2)
+    scheduler.run()
+    assert [job.state for job in jobs] == ['Done', 'Done']
+    assert scheduler.most_in_flight == 2
+
+
+def test_a_job_waits_until_the_memory_budget_has_room(executor, estimate):
+    estimate(150)
+    scheduler = TimedScheduler(executor, memory_budget=200, max_parallel_jobs=3)
+    jobs = add_jobs(scheduler, 3)
+    scheduler.run()
+    assert [job.state for job in jobs] == ['Done', 'Done', 'Done']
+    assert scheduler.most_in_flight == 1
+
+
+def test_the_first_job_starts_even_over_the_memory_budget(executor, estimate):
+    estimate(500)
+    scheduler = TimedScheduler(executor, memory_budget=200)
+    jobs = add_jobs(scheduler, 2)
+    scheduler.run()
+    assert [job.state for job in jobs] == ['Done', 'Done']
+    assert scheduler.most_in_flight == 1
+
+
+def test_a_folder_that_cannot_be_listed_fails_only_its_own_job(tmp_path, executor):
+    folders = [write_frames(tmp_path / "a", [(64, 48)] * 3), str(tmp_path / "missing"),
+               write_frames(tmp_path / "c", [(64, 48)] * 3)]
+    scheduler = BatchScheduler(cpu_budget=2, executor=executor)
+    jobs = [scheduler.add(BatchJob(folder, RenderSettings(name=f"job{number}", use_cache=False),
+                                   target_dir=str(tmp_path)))
+            for number, folder in enumerate(folders)]
+    scheduler.run()
+
+    assert [job.state for job in jobs] == ['Done', 'Error', 'Done']
+    assert isinstance(jobs[1].error, FileNotFoundError)
+    assert (tmp_path / "job0.pdf").exists() and (tmp_path / "job2_grid.pdf").exists()
+    assert jobs[0].done == jobs[2].done == 3
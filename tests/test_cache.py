@@ -0,0 +1,93 @@
+import os
+from dataclasses import replace
+from io import BytesIO
+from PIL import Image
+from magick_prototype.cache import CACHE_DIR_NAME, RenderCache
+from magick_prototype.engine import PANEL_STYLES, PanelImage, PanelJob
+from tests.support import pages, render, write_frames
+
+
+def panel_image(size=(32, 24)):
+    data = BytesIO()
+    Image.new("RGB", size).save(data, format="JPEG")
+    return PanelImage(data.getvalue(), *size)
+
+
+def cached_frame(tmp_path):
+    """ A cache holding every style of a one frame folder, and the frame's job """
+    frames_dir = write_frames(tmp_path / "frames", [(64, 48)])
+    cache = RenderCache(str(tmp_path / "out"))
+    job = PanelJob(0, frames_dir, "1_101_000.jpg", "1", "101", "000", (255, 255, 255), (0, 0, 0))
+    cache.put_all(job, PANEL_STYLES, {name: panel_image() for name in PANEL_STYLES}, cache.source_stat(job))
+    return cache, job
+
+
+def test_an_unchanged_frame_hits_every_style(tmp_path):
+    cache, job = cached_frame(tmp_path)
+    panel_images = cache.get_all(job, PANEL_STYLES, cache.source_stat(job))
+    assert {name: (image.width, image.height) for name, image in panel_images.items()} == {
+        name: (32, 24) for name in PANEL_STYLES}
+    assert (cache.hits, cache.misses) == (1, 0)
+
+
+def test_a_changed_mtime_or_size_misses(tmp_path):
+    cache, job = cached_frame(tmp_path)
+    source_path = os.path.join(job.my_dir, job.file_name)
+    stat = os.stat(source_path)
+
+    os.utime(source_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert cache.get_all(job, PANEL_STYLES, cache.source_stat(job)) is None
+
+    with open(source_path, "ab") as source_file:
+        source_file.write(b"\0")
+    os.utime(source_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert cache.get_all(job, PANEL_STYLES, cache.source_stat(job)) is None
+    assert cache.misses == 2
+
+
+def test_a_changed_style_or_color_misses(tmp_path):
+    cache, job = cached_frame(tmp_path)
+    source_stat = cache.source_stat(job)
+    assert cache.get_all(job, {**PANEL_STYLES, "grid": replace(PANEL_STYLES["grid"], max_size=480)},
+                         source_stat) is None
+    assert cache.get_all(replace(job, font_color=(255, 0, 0)), PANEL_STYLES, source_stat) is None
+
+
+def test_a_hit_never_decodes_the_source(tmp_path):
+    frames_dir = write_frames(tmp_path / "frames", [(64, 48)] * 12)
+    out_dir = tmp_path / "out"
+    render(frames_dir, out_dir, use_cache=True)
+    expected = pages(out_dir)
+
+    # every frame but the first, whose header lays out the grid, is no longer an image with its old stat
+    for frame in range(2, 13):
+        source_path = os.path.join(frames_dir, f"{frame}_101_000.jpg")
+        stat = os.stat(source_path)
+        with open(source_path, "wb") as source_file:
+            source_file.write(b"\0" * stat.st_size)
+        os.utime(source_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    render(frames_dir, out_dir, use_cache=True)
+    assert pages(out_dir) == expected
+
+
+def test_evict_removes_the_least_recently_touched_entries_first(tmp_path):
+    cache = RenderCache(str(tmp_path))
+    entry = panel_image()
+    for number, key in enumerate("abcd"):
+        cache.put(key, entry)
+        os.utime(cache.entry_path(key), (number, number))
+    # a hit touches its entry
+    assert cache.get("a") is not None
+
+    cache.max_bytes = len(entry.data) * 2
+    cache.evict()
+    assert sorted(os.listdir(tmp_path / CACHE_DIR_NAME)) == ["a.jpg", "d.jpg"]
+
+
+def test_evict_leaves_a_cache_within_max_bytes_alone(tmp_path):
+    cache = RenderCache(str(tmp_path))
+    for key in "abcd":
+        cache.put(key, panel_image())
+    cache.evict()
+    assert len(os.listdir(tmp_path / CACHE_DIR_NAME)) == 4
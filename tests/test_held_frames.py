@@ -0,0 +1,43 @@
+from concurrent.futures import Future
+from magick_prototype.engine import HeldFrames, PanelJob
+
+
+def job(frames_dir, frame, episode="101"):
+    return PanelJob(frame, str(frames_dir), f"{frame}_{episode}_000.jpg", str(frame), episode, "000",
+                    (255, 255, 255), (0, 0, 0))
+
+
+def write(frames_dir, frame, data, episode="101"):
+    (frames_dir / f"{frame}_{episode}_000.jpg").write_bytes(data)
+    return len(data)
+
+
+def test_a_held_cel_reuses_the_future_of_its_first_frame(tmp_path):
+    held = HeldFrames()
+    future = Future()
+    held.add(job(tmp_path, 1), write(tmp_path, 1, b"cel a"), future)
+
+    assert held.find(job(tmp_path, 2), write(tmp_path, 2, b"cel a")) is future
+    # read ahead bytes are hashed instead of the file
+    assert held.find(job(tmp_path, 3), 5, b"cel a") is future
+    assert held.duplicates == 2
+
+
+def test_frames_of_other_bytes_or_another_episode_are_not_held(tmp_path):
+    held = HeldFrames()
+    held.add(job(tmp_path, 1), write(tmp_path, 1, b"cel a"), Future())
+
+    assert held.find(job(tmp_path, 2), write(tmp_path, 2, b"cel b")) is None
+    assert held.find(job(tmp_path, 3, episode="102"), write(tmp_path, 3, b"cel a", episode="102")) is None
+    assert held.duplicates == 0
+
+
+def test_only_the_last_max_entries_panels_are_kept(tmp_path):
+    held = HeldFrames(max_entries=2)
+    # sources of different sizes, so each panel has an entry of its own
+    for frame in range(1, 4):
+        held.add(job(tmp_path, frame), write(tmp_path, frame, b"cel" * frame), Future())
+
+    assert held.count == 2
+    assert held.find(job(tmp_path, 4), write(tmp_path, 4, b"cel")) is None
+    assert held.find(job(tmp_path, 5), write(tmp_path, 5, b"cel" * 3)) is not None
@@ -0,0 +1,45 @@
+from magick_prototype.layout import apply_layout, grid_layout
+from magick_prototype.render import RenderSettings
+from tests.support import page_sizes, render, write_frames
+
+
+def test_grid_layout_slots_run_left_to_right_from_the_top():
+    layout = grid_layout(RenderSettings(name="s", panel_rows=2, panel_columns=2), (100, 50))
+    # 2 cells, 1 panel padding and 2 page paddings across, title and footer paddings down
+    assert layout.page_size == (350, 420)
+    assert layout.slots == ((50, 220), (200, 220), (50, 120), (200, 120))
+
+
+def test_grid_layout_fits_the_page_onto_paper_in_the_larger_orientation():
+    layout = grid_layout(RenderSettings(name="s", paper="A4"), (320, 180))
+    # a 1160 x 910 page is limited by the height of landscape A4 and centered across it
+    assert layout.content_size == (1160, 910)
+    assert layout.page_size == (842, 595)
+    assert layout.scale == 595 / 910
+    assert layout.origin == ((842 - 1160 * layout.scale) / 2, 0)
+
+
+def test_place_centers_a_panel_of_another_size_in_its_cell():
+    layout = grid_layout(RenderSettings(name="s"), (200, 100))
+    x, y = layout.slots[0]
+    assert layout.place(0, 200, 100) == (x, y, 200, 100)
+    assert layout.place(0, 100, 100) == (x + 50, y, 100, 100)
+
+
+def test_a_smaller_grid_max_size_is_kept_by_a_layout():
+    settings = apply_layout(RenderSettings(name="s", grid_max_size=320), "Contact Sheet")
+    assert (settings.panel_rows, settings.panel_columns, settings.grid_max_size) == (6, 8, 320)
+
+
+def test_resume_keeps_the_first_frames_layout(tmp_path):
+    frames_dir = write_frames(tmp_path / "frames", [(320, 180)] * 9 + [(200, 400)] * 21)
+    render(frames_dir, tmp_path / "fresh")
+    fresh = page_sizes(tmp_path / "fresh" / "s_grid.pdf")
+
+    # the resume reuses the first page and renders the rest from a 200 x 400 frame
+    out_dir = tmp_path / "resumed"
+    render(frames_dir, out_dir, stop_after_page=1)
+    render(frames_dir, out_dir, resume=True)
+
+    assert fresh == [(1160, 1045)] * 4
+    assert page_sizes(out_dir / "s_grid.pdf") == fresh
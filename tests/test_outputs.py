@@ -0,0 +1,16 @@
+import json
+from tests.support import render, write_frames
+
+
+def test_a_render_of_only_the_sinks_resumes_every_shard(tmp_path):
+    frames_dir = write_frames(tmp_path / "frames", [(160, 90)] * 30)
+    out_dir = tmp_path / "out"
+
+    assert render(frames_dir, out_dir, outputs=("sequence", "contact"), keep_shards=True) == list(range(30))
+    with open(out_dir / "s.checkpoint.json") as checkpoint_file:
+        shards = json.load(checkpoint_file)["shards"]
+    assert [(shard["first_index"], shard["last_index"]) for shard in shards] == [(0, 8), (9, 17), (18, 26), (27, 29)]
+
+    assert render(frames_dir, out_dir, outputs=("sequence", "contact"), resume=True) == []
+    assert len(list((out_dir / "s_sequence").iterdir())) == 30
+    assert len(list((out_dir / "s_contact").iterdir())) == 4
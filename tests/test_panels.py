@@ -0,0 +1,29 @@
+from magick_prototype.panels import Panel, natural_key, sort_panels
+
+
+def test_natural_key_orders_digit_runs_by_value():
+    names = ["10_101_000.jpg", "9_101_000.jpg", "100_101_000.jpg", "1_101_000.jpg", "9_101_010.jpg"]
+    assert sorted(names, key=natural_key) == [
+        "1_101_000.jpg", "9_101_000.jpg", "9_101_010.jpg", "10_101_000.jpg", "100_101_000.jpg"]
+
+
+def test_natural_key_ignores_case_and_mixes_text_with_digits():
+    names = ["Shot10b", "shot2", "SHOT10a", "shot", "take1"]
+    assert sorted(names, key=natural_key) == ["shot", "shot2", "SHOT10a", "Shot10b", "take1"]
+
+
+def test_panels_sort_by_frame_then_file_name():
+    panels = sort_panels(Panel(name) for name in ["10_101_000.png", "2_101_000.jpg", "10_101_000.jpg", "A_101_000.jpg"])
+    assert [panel.file_name for panel in panels] == [
+        "2_101_000.jpg", "10_101_000.jpg", "10_101_000.png", "A_101_000.jpg"]
+
+
+def test_panels_of_one_frame_sort_naturally_by_episode_then_scene():
+    names = ["1_101_000.jpg", "1_99_010.jpg", "1_99_9.jpg", "1_99_9.png", "1_Undefined.jpg"]
+    assert [panel.file_name for panel in sort_panels(Panel(name) for name in reversed(names))] == [
+        "1_99_9.jpg", "1_99_9.png", "1_99_010.jpg", "1_101_000.jpg", "1_Undefined.jpg"]
+
+
+def test_missing_parts_of_a_name_are_undefined():
+    panel = Panel("12.jpg")
+    assert (panel.frame, panel.episode, panel.scene) == ("12", "Undefined", "Undefined")
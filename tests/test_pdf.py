@@ -0,0 +1,66 @@
+import pytest
+from PIL import Image
+from pypdf import PdfReader
+from reportlab.pdfgen import canvas
+from magick_prototype.pdf import merge_pdfs
+
+
+@pytest.fixture
+def panel_image(tmp_path):
+    path = tmp_path / "held.png"
+    Image.new("RGB", (64, 48), (200, 40, 40)).save(path)
+    return str(path)
+
+
+def write_pdf(path, pages, image_path):
+    """ A ReportLab PDF of one page per title, every page drawing the same image """
+    pdf = canvas.Canvas(str(path), pagesize=(200, 200))
+    for title in pages:
+        pdf.drawImage(image_path, 10, 10)
+        pdf.drawString(10, 150, title)
+        pdf.showPage()
+    pdf.save()
+    return str(path)
+
+
+def image_refs(page):
+    xobjects = page["/Resources"]["/XObject"]
+    return {xobjects.raw_get(name).idnum for name in xobjects}
+
+
+def test_merge_keeps_every_page_in_order(tmp_path, panel_image):
+    paths = [write_pdf(tmp_path / f"{part}.pdf", [f"page {part}.{page}" for page in range(part + 1)], panel_image)
+             for part in range(3)]
+    out_path = tmp_path / "merged.pdf"
+    merge_pdfs(paths, str(out_path))
+
+    reader = PdfReader(out_path, strict=True)
+    assert len(reader.pages) == 6
+    assert [page.extract_text().strip() for page in reader.pages] == [
+        "page 0.0", "page 1.0", "page 1.1", "page 2.0", "page 2.1", "page 2.2"]
+
+
+def test_merge_of_one_input_moves_it(tmp_path, panel_image):
+    path = write_pdf(tmp_path / "0.pdf", ["page 0"], panel_image)
+    out_path = tmp_path / "merged.pdf"
+    assert merge_pdfs([path], str(out_path)) == 0
+    assert [page.extract_text().strip() for page in PdfReader(out_path, strict=True).pages] == ["page 0"]
+    assert not (tmp_path / "0.pdf").exists()
+
+
+def test_merge_of_one_input_keeps_it_with_keep_inputs(tmp_path, panel_image):
+    path = write_pdf(tmp_path / "0.pdf", ["page 0"], panel_image)
+    merge_pdfs([path], str(tmp_path / "merged.pdf"), keep_inputs=True)
+    assert (tmp_path / "0.pdf").read_bytes() == (tmp_path / "merged.pdf").read_bytes()
+
+
+def test_merge_shares_identical_objects_across_inputs(tmp_path, panel_image):
+    paths = [write_pdf(tmp_path / f"{part}.pdf", [f"page {part}"], panel_image) for part in range(3)]
+    out_path = tmp_path / "merged.pdf"
+    duplicate_bytes = merge_pdfs(paths, str(out_path))
+
+    reader = PdfReader(out_path, strict=True)
+    assert duplicate_bytes > 0
+    assert len({frozenset(image_refs(page)) for page in reader.pages}) == 1
+    # every page keeps its own object
+    assert len({page.indirect_reference.idnum for page in reader.pages}) == 3
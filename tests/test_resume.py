@@ -0,0 +1,65 @@
+import os
+import pytest
+from tests.support import page_sizes, pages, render, write_frame, write_frames
+
+UNIFORM = [(320, 180)] * 30
+MIXED = [(320, 180)] * 9 + [(200, 400)] * 21
+
+
+@pytest.mark.parametrize("sizes", [UNIFORM, MIXED], ids=["uniform", "mixed"])
+def test_stop_then_resume_matches_a_fresh_render(tmp_path, sizes):
+    frames_dir = write_frames(tmp_path / "frames", sizes)
+    render(frames_dir, tmp_path / "fresh")
+
+    out_dir = tmp_path / "resumed"
+    render(frames_dir, out_dir, stop_after_page=1)
+    assert len(page_sizes(out_dir / "s_grid.pdf")) < 4
+    rendered = render(frames_dir, out_dir, resume=True)
+
+    assert 0 not in rendered
+    assert pages(out_dir) == pages(tmp_path / "fresh")
+    assert not os.path.exists(out_dir / "s.checkpoint.json")
+
+
+def test_a_resume_with_other_settings_keeps_the_finished_shards(tmp_path):
+    frames_dir = write_frames(tmp_path / "frames", UNIFORM)
+    out_dir = tmp_path / "out"
+    render(frames_dir, out_dir, stop_after_page=1)
+    parts = sorted(path.name for path in out_dir.glob("*.part"))
+    assert parts
+
+    with pytest.raises(ValueError, match="other settings"):
+        render(frames_dir, out_dir, resume=True, font_color=(255, 0, 0))
+    assert sorted(path.name for path in out_dir.glob("*.part")) == parts
+
+    assert 0 not in render(frames_dir, out_dir, resume=True)
+
+
+def change_frame(frames_dir):
+    write_frame(frames_dir, 14, (320, 180), shade=255)
+
+
+def add_frame(frames_dir):
+    write_frame(frames_dir, 31, (320, 180))
+
+
+def remove_frame(frames_dir):
+    os.remove(frames_dir / "14_101_000.jpg")
+
+
+# 30 frames are 3 whole pages and a partial one of 3x3, the indices each change renders again
+@pytest.mark.parametrize("change, rendered", [
+    (change_frame, range(9, 18)),
+    (add_frame, range(27, 31)),
+    (remove_frame, range(9, 29)),
+], ids=["changed", "added", "removed"])
+def test_a_resume_renders_only_the_shards_a_frame_change_touches(tmp_path, change, rendered):
+    frames_dir = tmp_path / "frames"
+    write_frames(frames_dir, UNIFORM)
+    out_dir = tmp_path / "out"
+    render(str(frames_dir), out_dir, keep_shards=True)
+
+    change(frames_dir)
+    assert render(str(frames_dir), out_dir, resume=True, keep_shards=True) == list(rendered)
+    render(str(frames_dir), tmp_path / "fresh")
+    assert pages(out_dir) == pages(tmp_path / "fresh")